@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare XML-RPC and JSON-RPC for large Odoo reads: wall time, decode time and bytes on the wire
+Usage::
+    ./benchmark_odoo_protocols.py [<model>] [<limit>] [<rounds>]
+"""
+import json
+import sys
+import time
+import xmlrpc.client
+
+sys.path.insert(0, 'helpers/')
+
+from helpers.odoo_connector import OdooConnector
+
+DEFAULT_FIELDS = {
+    "product.template": [
+        "id", "name", "default_code", "list_price", "standard_price", "qty_available",
+        "weight", "active", "taxes_id", "product_variant_ids", "attribute_line_ids", "write_date",
+    ],
+    "product.product": [
+        "id", "display_name", "default_code", "lst_price", "standard_price", "qty_available",
+        "weight", "active", "product_tmpl_id", "product_template_variant_value_ids",
+    ],
+}
+
+
+def time_call(fn, rounds):
+    timings = []
+    result = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def benchmark_protocols(model="product.template", limit=500, rounds=5):
+    fields = DEFAULT_FIELDS.get(model, ["id", "name", "write_date"])
+    print(f"📊 Benchmarking {model}: {limit} records x {len(fields)} fields, best of {rounds}")
+
+    records = None
+    for protocol in ("xmlrpc", "jsonrpc"):
+        connector = OdooConnector(protocol=protocol)
+        best, records = time_call(
+            lambda: connector.search_read(model, [], fields, offset=0, limit=limit), rounds
+        )
+        print(f"  🌐 {protocol:8} live search_read: {best * 1000:8.1f} ms ({len(records)} records)")
+
+    if not records:
+        print("❌ No records returned, nothing to compare")
+        return
+
+    # Re-encode the same payload both ways so decode cost and size are compared on identical data
+    xml_body = xmlrpc.client.dumps((records,), methodresponse=True, allow_none=True).encode("utf-8")
+    json_body = json.dumps({"jsonrpc": "2.0", "id": 1, "result": records}).encode("utf-8")
+
+    xml_decode, _ = time_call(lambda: xmlrpc.client.loads(xml_body), rounds)
+    json_decode, _ = time_call(lambda: json.loads(json_body), rounds)
+
+    print(f"  📦 xmlrpc   body: {len(xml_body):10,d} bytes, decode {xml_decode * 1000:8.1f} ms")
+    print(f"  📦 jsonrpc  body: {len(json_body):10,d} bytes, decode {json_decode * 1000:8.1f} ms")
+    print(f"  ✅ jsonrpc is {len(xml_body) / len(json_body):.1f}x smaller and decodes {xml_decode / max(json_decode, 1e-9):.1f}x faster")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    benchmark_protocols(
+        model=args[0] if len(args) > 0 else "product.template",
+        limit=int(args[1]) if len(args) > 1 else 500,
+        rounds=int(args[2]) if len(args) > 2 else 5,
+    )
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Cost of turning fetched rows into Python values: the old JSON round trip vs SQLConnector.fetch()
+Rows are synthetic `products` rows as DictCursor returns them, so no database is needed.
+Usage::
+    ./benchmark_sql_fetch.py [<rows>] [<rounds>]
+"""
+import datetime
+import json
+import sys
+import time
+from decimal import Decimal
+
+from helpers.sql_connector import SQLResult, json_safe
+
+
+def product_rows(count):
+    now = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        {
+            "id": i,
+            "remote_key_id": str(i),
+            "name": "Product %05d" % i,
+            "sku": "TPL-%05d" % i,
+            "qty": i % 50,
+            "price": Decimal("%d.%02d" % (i % 500, i % 100)),
+            "price_without_tax": Decimal("%d.00" % (i % 400)),
+            "tax_rate": Decimal("15.00"),
+            "thumb_image": "https://odoo.eboutiques.com/public/product_image/%d/image_1920" % i,
+            "status": 1,
+            "created_at": now,
+            "updated_at": now + datetime.timedelta(minutes=i),
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def time_call(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def json_round_trip(results):
+    # what fetch() did before: toJSON() then json.loads
+    return json.loads(json.dumps(results, default=str))
+
+
+def benchmark_fetch(count=100000, rounds=3):
+    rows = product_rows(count)
+    result = SQLResult(rows)
+    print(f"📊 Fetching {count:,d} rows x {len(rows[0])} columns, best of {rounds}")
+
+    old = time_call(lambda: json_round_trip(rows), rounds)
+    raw = time_call(lambda: result.fetch(), rounds)
+    typed = time_call(lambda: result.fetch(coerce={"qty": int, "price": float}), rounds)
+    legacy = time_call(lambda: result.fetch(coerce=json_safe), rounds)
+
+    print(f"  🐢 json round trip:           {old * 1000:8.1f} ms")
+    print(f"  ⚡ fetch():                   {raw * 1000:8.1f} ms")
+    print(f"  🔢 fetch(coerce=qty/price):   {typed * 1000:8.1f} ms")
+    print(f"  🧵 fetch(coerce=json_safe):   {legacy * 1000:8.1f} ms")
+    print(f"  ✅ fetch() saves {(old - raw) * 1000:.0f} ms per {count:,d} rows, {(old - legacy) * 1000:.0f} ms even with json_safe")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    benchmark_fetch(
+        count=int(args[0]) if len(args) > 0 else 100000,
+        rounds=int(args[1]) if len(args) > 1 else 3,
+    )
@@ -9,74 +9,79 @@ from time import sleep
 
 sys.path.insert(0, 'helpers/')
 
-from helpers.file_helper import read_time_stamp, write_time_stamp
-from helpers.helpers import flatten, odooReadSearch
-from helpers.odoo_connector import OdooConnector
+from helpers.file_helper import read_json_file, read_time_stamp, write_json_file, write_time_stamp
+from helpers.helpers import flatten, odooIterReadSearch
+from helpers.odoo_connector import shared_connector
 from helpers.product_helpers import ProductHelper
 from helpers.sql_connector import SQLConnector
+from helpers.stock_helpers import StockQuantReader
+
+IMAGE_FINGERPRINTS_FILE = "image_fingerprints.json"
 
 def detect_quantity_changes(connector, sql_connector, helper, limit=100):
     """Detect and sync products with quantity changes"""
     print("\n🔢 Detecting quantity changes...")
     
     try:
-        # Get all synced products from Laravel
-        synced_products = sql_connector.getAll(
-            "products", 
-            "`remote_key_id` IS NOT NULL AND `remote_key_id` != ''"
-        ).fetch()
-        
-        if not synced_products:
+        # Stream the synced products from Laravel and compare each chunk with Odoo as it arrives,
+        # stream() keeps the scan open across the Odoo reads of a chunk (DB_STREAM_WRITE_TIMEOUT)
+        stock_reader = StockQuantReader(connector, name="detect_quantity_changes")
+        checked_count = 0
+        changed_products = []
+        variants = {}
+        
+        # Chunks follow the reader's template batch size, learned from recent Odoo latency
+        for batch in stock_reader.template_batcher.chunks(sql_connector.stream(
+            "products",
+            ["id", "remote_key_id", "name", "qty"],
+            [("remote_key_id", "!=", None), ("remote_key_id", "!=", "")],
+        )):
+            # Current on-hand quantities of the chunk's templates and variants, summed from stock.quant
+            batch_variants = stock_reader.variants([int(p['remote_key_id']) for p in batch])
+            odoo_quantities = stock_reader.template_totals(batch_variants)
+            checked_count += len(batch)
+            
+            for laravel_product in batch:
+                template_id = int(laravel_product['remote_key_id'])
+                odoo_qty = int(odoo_quantities.get(template_id, 0))
+                if odoo_qty != int(laravel_product['qty']):
+                    changed_products.append((laravel_product, odoo_qty))
+                    variants[template_id] = batch_variants.get(template_id, [])
+        
+        if not checked_count:
             print("❌ No synced products found")
             return 0
         
-        print(f"📊 Checking {len(synced_products)} synced products for quantity changes")
-        
-        # Get Odoo product IDs
-        odoo_ids = [int(p['remote_key_id']) for p in synced_products]
-        
-        # Fetch current quantities from Odoo in batches
-        batch_size = 50
+        print(f"📊 Checked {checked_count} synced products, {len(changed_products)} with quantity changes")
         updated_count = 0
         
-        for i in range(0, len(odoo_ids), batch_size):
-            batch_ids = odoo_ids[i:i + batch_size]
-            
-            # Get current Odoo quantities
-            odoo_products = connector.read(
-                'product.template',
-                batch_ids,
-                ['id', 'qty_available', 'write_date']
-            )
-            
-            for odoo_product in odoo_products:
-                # Find corresponding Laravel product
-                laravel_product = next(
-                    (p for p in synced_products if int(p['remote_key_id']) == odoo_product['id']), 
-                    None
+        # Writes happen after the scan so the stream is never left waiting on them
+        # Product and variant writes are committed in batches instead of one commit per row
+        with sql_connector.buffer(max_rows=500) as writes:
+            for laravel_product, odoo_qty in changed_products:
+                template_id = int(laravel_product['remote_key_id'])
+                laravel_qty = int(laravel_product['qty'])
+                
+                print(f"🔄 Quantity change detected:")
+                print(f"   Product: {laravel_product['name']}")
+                print(f"   Laravel QTY: {laravel_qty} → Odoo QTY: {odoo_qty}")
+                
+                # Update Laravel quantity
+                writes.update(
+                    "products",
+                    {"id": laravel_product['id']},
+                    {"qty": odoo_qty}
                 )
                 
-                if laravel_product:
-                    odoo_qty = int(odoo_product['qty_available'])
-                    laravel_qty = int(laravel_product['qty'])
-                    
-                    if odoo_qty != laravel_qty:
-                        print(f"🔄 Quantity change detected:")
-                        print(f"   Product: {laravel_product['name']}")
-                        print(f"   Laravel QTY: {laravel_qty} → Odoo QTY: {odoo_qty}")
-                        
-                        # Update Laravel quantity
-                        sql_connector.update(
-                            "products",
-                            f"`id` = '{laravel_product['id']}'",
-                            {"qty": odoo_qty}
-                        )
-                        
-                        # Also update variants
-                        update_variant_quantities(connector, sql_connector, odoo_product['id'], laravel_product['id'])
-                        
-                        updated_count += 1
-                        print(f"   ✅ Updated quantity: {laravel_qty} → {odoo_qty}")
+                # Also update variants
+                update_variant_quantities(connector, writes, template_id, laravel_product['id'], variants=variants.get(template_id, []))
+                
+                updated_count += 1
+                print(f"   ✅ Queued quantity update: {laravel_qty} → {odoo_qty}")
+        
+        for failure in writes.failures:
+            print(f"   ❌ {failure['kind']} on {failure['table']} failed: {failure['error']}")
+        updated_count -= len([f for f in writes.failures if f['table'] == "products"])
         
         print(f"🎉 Updated {updated_count} products with quantity changes")
         return updated_count
@@ -85,22 +90,21 @@ def detect_quantity_changes(connector, sql_connector, helper, limit=100):
         print(f"❌ Quantity change detection failed: {str(e)}")
         return 0
 
-def update_variant_quantities(connector, sql_connector, template_id, laravel_product_id):
-    """Update variant quantities for a specific product"""
+def update_variant_quantities(connector, sql_connector, template_id, laravel_product_id, variants=None):
+    """Update variant quantities for a specific product, `variants` as prefetched by StockQuantReader.variants"""
     try:
-        # Get Odoo variants
-        variant_ids = connector.search('product.product', [('product_tmpl_id', '=', template_id)])
-        if not variant_ids:
+        # Get Odoo variants with their on-hand quantity
+        if variants is None:
+            variants = StockQuantReader(connector).variants([template_id]).get(template_id, [])
+        if not variants:
             return
-            
-        variants = connector.read('product.product', variant_ids, ['id', 'default_code', 'qty_available'])
         
         for variant in variants:
             if variant.get('default_code'):  # Only update variants with SKU
                 # Update Laravel variant
                 sql_connector.update(
                     "product_variants",
-                    f"`product_id` = '{laravel_product_id}' AND `remote_key_id` = '{variant['id']}'",
+                    {"product_id": laravel_product_id, "remote_key_id": str(variant['id'])},
                     {"stock": variant['qty_available']}
                 )
                 
@@ -118,19 +122,13 @@ def detect_image_changes(connector, sql_connector, helper, limit=100):
         # Get products updated in the last 2 hours (more frequent for images)
         recent_time = (datetime.now() - timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S')
         
-        updated_products = odooReadSearch(
+        updated_products = list(odooIterReadSearch(
             connector,
             "product.template",
-            where_clause=["write_date", ">=", recent_time],
-            sFields=[
-                "id", "name", "write_date", 
-                "image_1920", "image_1024", "image_512",
-                # Gallery image fields
-                "image_1", "image_2", "image_3", "image_4", "image_5",
-                "image_6", "image_7", "image_8", "image_9", "image_10"
-            ],
+            where_clause=("write_date", ">=", recent_time),
+            sFields=["id", "name", "write_date"],
             limit=limit
-        )
+        ))
         
         if not updated_products:
             print("❌ No recently updated products found")
@@ -138,14 +136,23 @@ def detect_image_changes(connector, sql_connector, helper, limit=100):
         
         print(f"📊 Checking {len(updated_products)} recently updated products for image changes")
         
+        # Compare attachment checksums instead of pulling base64 image data over RPC
+        fingerprints = helper.get_image_fingerprints([p['id'] for p in updated_products])
+        known_fingerprints = read_json_file(IMAGE_FINGERPRINTS_FILE, {})
+        
         updated_count = 0
         
         for product in updated_products:
             try:
+                fingerprint = fingerprints.get(product['id'], {})
+                if known_fingerprints.get(str(product['id'])) == fingerprint:
+                    continue
+                product['image_1920'] = fingerprint.get('image_1920', False)
+                
                 # Check if this product exists in Laravel
                 laravel_product = sql_connector.getOne(
                     "products", 
-                    f"`remote_key_id` = '{product['id']}'"
+                    {"remote_key_id": str(product['id'])}
                 ).fetch()
                 
                 if not laravel_product:
@@ -154,19 +161,26 @@ def detect_image_changes(connector, sql_connector, helper, limit=100):
                 print(f"\n🔍 Checking images for: {product['name']} (ID: {product['id']})")
                 
                 # Check main image change
-                main_image_changed = check_main_image_change(product, laravel_product, helper)
+                main_image_changed, main_ok = check_main_image_change(product, laravel_product, helper)
                 
                 # Check gallery image changes
-                gallery_changed = check_gallery_image_changes(product, laravel_product, helper, sql_connector)
+                gallery_changed, gallery_ok = check_gallery_image_changes(product, laravel_product, helper, sql_connector)
                 
                 if main_image_changed or gallery_changed:
                     updated_count += 1
                     print(f"✅ Updated images for: {product['name']}")
                 
+                # Only a fully checked product is skipped next time, failed checks are retried
+                if main_ok and gallery_ok:
+                    known_fingerprints[str(product['id'])] = fingerprint
+                else:
+                    print(f"⚠️  Image check incomplete for {product['name']}, retrying next cycle")
+                
             except Exception as e:
                 print(f"⚠️  Error checking images for product {product.get('id', 'unknown')}: {str(e)}")
                 continue
         
+        write_json_file(IMAGE_FINGERPRINTS_FILE, known_fingerprints)
         print(f"🎉 Updated {updated_count} products with image changes")
         return updated_count
         
@@ -175,10 +189,10 @@ def detect_image_changes(connector, sql_connector, helper, limit=100):
         return 0
 
 def check_main_image_change(odoo_product, laravel_product, helper):
-    """Check if main product image has changed"""
+    """Check if main product image has changed, returns (changed, checked without errors)"""
     try:
         if not odoo_product.get('image_1920'):
-            return False
+            return False, True
         
         # Generate new Odoo URL
         new_image_url = f"https://odoo.eboutiques.com/public/product_image/{odoo_product['id']}/image_1920"
@@ -198,46 +212,48 @@ def check_main_image_change(odoo_product, laravel_product, helper):
                     # Update Laravel product
                     helper.sql_connector.update(
                         "products",
-                        f"`id` = '{laravel_product['id']}'",
+                        {"id": laravel_product['id']},
                         {"thumb_image": new_image_url}
                     )
                     print(f"     ✅ Main image updated")
-                    return True
+                    return True, True
                 else:
                     print(f"     ⚠️  New image URL not accessible")
+                    return False, False
             except Exception as e:
                 print(f"     ⚠️  Failed to verify new image URL: {str(e)}")
+                return False, False
         
-        return False
+        return False, True
         
     except Exception as e:
         print(f"  ❌ Main image check failed: {str(e)}")
-        return False
+        return False, False
 
 def check_gallery_image_changes(odoo_product, laravel_product, helper, sql_connector):
-    """Check if gallery images have changed"""
+    """Check if gallery images have changed, returns (changed, checked without errors)"""
     try:
         print(f"  🖼️  Checking gallery images...")
         
         # Re-sync gallery (this will detect additions/removals)
-        gallery_count = helper.sync_product_gallery(odoo_product['id'], laravel_product['id'])
+        gallery_count = helper.sync_product_gallery(odoo_product['id'], laravel_product['id'], strict=True)
         
         if gallery_count > 0:
             print(f"  ✅ Gallery updated: {gallery_count} images")
-            return True
+            return True, True
         
-        return False
+        return False, True
         
     except Exception as e:
         print(f"  ❌ Gallery check failed: {str(e)}")
-        return False
+        return False, False
 
 def enhanced_product_sync_runner():
     """Enhanced product sync with quantity and image change detection"""
     print("🚀 Starting enhanced product sync with change detection...")
     
     try:
-        connector = OdooConnector()
+        connector = shared_connector()
         sql_connector = SQLConnector()
         helper = ProductHelper(connector, sql_connector)
         
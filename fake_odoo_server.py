@@ -0,0 +1,593 @@
+#!/usr/bin/env python3
+"""
+In-repo stand-in for Odoo's /xmlrpc/2/common, /xmlrpc/2/object and /jsonrpc endpoints,
+for benchmarking and regression-testing the syncer without a live Odoo.
+
+Serves a synthetic catalog (or answers from a recording of real traffic) with configurable
+per-call latency, jitter and error injection. Point ODOO_URL at it:
+
+    ./fake_odoo_server.py --port 8069 --products 5000 --latency-ms 40 --jitter-ms 20
+    ./fake_odoo_server.py --record https://odoo.example.com --recording traffic.jsonl
+    ./fake_odoo_server.py --replay traffic.jsonl
+"""
+import argparse
+import base64
+import fnmatch
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import xmlrpc.client
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_UID = 2
+IMAGE_FIELDS = ["image_1920"] + ["image_%d" % i for i in range(1, 11)]
+# comodels of the many2one fields domains may traverse with dotted paths (location_id.usage)
+RELATIONS = {
+    "location_id": "stock.location",
+    "warehouse_id": "stock.warehouse",
+    "product_id": "product.product",
+    "product_tmpl_id": "product.template",
+}
+# related fields kept on fake records so domains can filter on them, Odoo cannot group by them
+NON_STORED = {
+    "stock.quant": {"product_tmpl_id"},
+}
+
+
+class FakeFault(Exception):
+    def __init__(self, name, message):
+        super().__init__(message)
+        self.name = name
+        self.message = message
+
+
+def leaf_value(value):
+    # many2one values are stored as [id, display_name], domains compare on the id
+    if isinstance(value, list) and len(value) == 2 and isinstance(value[0], int) and isinstance(value[1], str):
+        return value[0]
+    return value
+
+
+def like(value, pattern, case_sensitive):
+    if value is False or value is None:
+        return False
+    value, pattern = str(value), str(pattern)
+    if not case_sensitive:
+        value, pattern = value.lower(), pattern.lower()
+    return pattern in value
+
+
+def match_leaf(record, leaf, resolve=None):
+    field, operator, expected = leaf
+    value = leaf_value(resolve(record, field) if resolve and "." in field else record.get(field, False))
+    if operator in ("child_of", "parent_of") and isinstance(expected, (list, tuple)):
+        # no location hierarchy in the fake, a record is its own only child
+        operator = "in"
+    if operator in ("=", "child_of", "parent_of"):
+        if expected is False:
+            return not value
+        if isinstance(value, list):
+            return expected in value
+        return value == expected
+    if operator in ("!=", "<>"):
+        if expected is False:
+            return bool(value)
+        return value != expected
+    if operator in ("in", "not in"):
+        expected = expected if isinstance(expected, (list, tuple)) else [expected]
+        found = bool(set(value) & set(expected)) if isinstance(value, list) else value in expected
+        return found if operator == "in" else not found
+    if operator in ("<", "<=", ">", ">="):
+        if value is False or value is None:
+            return False
+        return {"<": value < expected, "<=": value <= expected, ">": value > expected, ">=": value >= expected}[operator]
+    if operator in ("like", "ilike", "not like", "not ilike"):
+        found = like(value, expected, case_sensitive=operator.endswith(" like") or operator == "like")
+        return found if not operator.startswith("not") else not found
+    if operator in ("=like", "=ilike"):
+        if value is False:
+            return False
+        pattern = str(expected).replace("%", "*").replace("_", "?")
+        if operator == "=ilike":
+            return fnmatch.fnmatch(str(value).lower(), pattern.lower())
+        return fnmatch.fnmatchcase(str(value), pattern)
+    raise FakeFault("ValueError", "Unsupported operator %s" % operator)
+
+
+def match_domain(record, domain, resolve=None):
+    # prefix notation evaluated right to left, leftover terms are implicitly AND-ed
+    stack = []
+    for token in reversed(list(domain or [])):
+        if token == "&":
+            stack.append(stack.pop() and stack.pop())
+        elif token == "|":
+            first, second = stack.pop(), stack.pop()
+            stack.append(first or second)
+        elif token == "!":
+            stack.append(not stack.pop())
+        elif not token:
+            stack.append(True)
+        else:
+            stack.append(match_leaf(record, token, resolve))
+    return all(stack)
+
+
+class FakeOdoo:
+    """In-memory models answering the ORM methods the syncer and helpers call"""
+
+    def __init__(self, products=500, variants_per_product=3, image_kb=0, seed=42):
+        self.models = {}
+        self.sequences = {}
+        self.lock = threading.Lock()
+        self.seed_catalog(products, variants_per_product, image_kb, seed)
+
+    # -- catalog ----------------------------------------------------------------------------
+
+    def add(self, model, values):
+        table = self.models.setdefault(model, {})
+        record_id = values.get("id") or self.sequences.get(model, 0) + 1
+        self.sequences[model] = max(self.sequences.get(model, 0), record_id)
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        record = {"id": record_id, "create_date": now, "write_date": now, "active": True}
+        record.update(values)
+        record["id"] = record_id
+        if "display_name" not in record and "name" in record:
+            record["display_name"] = record["name"]
+        table[record_id] = record
+        return record_id
+
+    def seed_catalog(self, products, variants_per_product, image_kb, seed):
+        rnd = random.Random(seed)
+        image = base64.b64encode(rnd.randbytes(image_kb * 1024)).decode("ascii") if image_kb else "iVBORw0KGgo="
+
+        self.add("ir.module.module", {"name": "base", "state": "installed", "latest_version": "17.0.1.3"})
+        self.add("ir.module.module", {"name": "stock", "state": "installed", "latest_version": "17.0.1.1"})
+        unit = self.add("uom.uom", {"name": "Units"})
+        taxes = [
+            self.add("account.tax", {"name": "VAT 15%", "amount": 15.0, "amount_type": "percent"}),
+            self.add("account.tax", {"name": "VAT 5%", "amount": 5.0, "amount_type": "percent"}),
+        ]
+        stock = self.add("stock.location", {"name": "WH/Stock", "usage": "internal"})
+        warehouse = self.add("stock.warehouse", {"name": "Main Warehouse", "lot_stock_id": [stock, "WH/Stock"]})
+        self.models["stock.location"][stock]["warehouse_id"] = [warehouse, "Main Warehouse"]
+        colors = [("Red", "#ff0000"), ("Blue", "#0000ff"), ("Black", "#000000"), ("White", "#ffffff")]
+        started = datetime.now() - timedelta(days=30)
+
+        for t in range(1, products + 1):
+            name = "Product %05d" % t
+            write_date = (started + timedelta(minutes=rnd.randint(0, 30 * 24 * 60))).strftime("%Y-%m-%d %H:%M:%S")
+            price = round(rnd.uniform(5, 500), 2)
+            has_image = rnd.random() < 0.8
+            gallery = rnd.randint(0, 4) if has_image else 0
+            template = {
+                "name": name,
+                "default_code": "TPL-%05d" % t,
+                "list_price": price,
+                "standard_price": round(price * rnd.uniform(0.3, 0.7), 2),
+                "weight": round(rnd.uniform(0.05, 3), 3),
+                "taxes_id": [rnd.choice(taxes)],
+                "uom_id": [unit, "Units"],
+                "write_date": write_date,
+                "image_1920": image if has_image else False,
+                "image_1024": image if has_image else False,
+                "image_512": image if has_image else False,
+            }
+            for i in range(1, 11):
+                template["image_%d" % i] = image if i <= gallery else False
+            template_id = self.add("product.template", template)
+
+            variant_ids = []
+            for v in range(variants_per_product):
+                color, html_color = colors[v % len(colors)]
+                value_id = self.add("product.template.attribute.value", {
+                    "name": color,
+                    "html_color": html_color,
+                    "attribute_line_id": [template_id, "Color"],
+                })
+                qty = float(rnd.randint(0, 50))
+                variant_id = self.add("product.product", {
+                    "name": name,
+                    "display_name": "%s (%s)" % (name, color),
+                    "default_code": "SKU-%05d-%d" % (t, v + 1),
+                    "lst_price": price,
+                    "standard_price": template["standard_price"],
+                    "qty_available": qty,
+                    "weight": template["weight"],
+                    "product_tmpl_id": [template_id, name],
+                    "product_template_variant_value_ids": [value_id],
+                    "uom_id": [unit, "Units"],
+                    "image_1920": template["image_1920"],
+                    "write_date": write_date,
+                })
+                variant_ids.append(variant_id)
+                if qty:
+                    self.add("stock.quant", {
+                        "product_id": [variant_id, "%s (%s)" % (name, color)],
+                        "product_tmpl_id": [template_id, name],
+                        "location_id": [stock, "WH/Stock"],
+                        "warehouse_id": [warehouse, "Main Warehouse"],
+                        "quantity": qty,
+                        "reserved_quantity": 0.0,
+                    })
+
+            self.models["product.template"][template_id].update({
+                "product_variant_ids": variant_ids,
+                "qty_available": sum(self.models["product.product"][v]["qty_available"] for v in variant_ids),
+            })
+            for field in IMAGE_FIELDS:
+                if template[field]:
+                    self.add("ir.attachment", {
+                        "name": field,
+                        "res_model": "product.template",
+                        "res_field": field,
+                        "res_id": template_id,
+                        "checksum": hashlib.sha1(("%s/%s/%s" % (template_id, field, write_date)).encode()).hexdigest(),
+                        "write_date": write_date,
+                    })
+
+    # -- ORM methods ------------------------------------------------------------------------
+
+    def table(self, model):
+        if model not in self.models:
+            self.models[model] = {}
+        return self.models[model]
+
+    def resolve(self, record, path):
+        value = record
+        for part in path.split("."):
+            if not isinstance(value, dict):
+                return False
+            value = value.get(part, False)
+            if part in RELATIONS and isinstance(value, list) and value:
+                value = self.table(RELATIONS[part]).get(value[0], False)
+        return value
+
+    def records(self, model, domain):
+        records = [r for r in self.table(model).values() if match_domain(r, domain, self.resolve)]
+        if not any(isinstance(leaf, (list, tuple)) and leaf[0] == "active" for leaf in domain or []):
+            records = [r for r in records if r.get("active", True)]
+        return records
+
+    def sort(self, records, order):
+        for part in reversed([p.strip() for p in (order or "id").split(",") if p.strip()]):
+            field, _, direction = part.partition(" ")
+            records.sort(key=lambda r: (r.get(field, False) is False, leaf_value(r.get(field, False))), reverse=direction.lower() == "desc")
+        return records
+
+    def project(self, record, fields):
+        if not fields:
+            return dict(record)
+        projected = {"id": record["id"]}
+        for field in fields:
+            projected[field] = record.get(field, False)
+        return projected
+
+    def search(self, model, domain, offset=0, limit=None, order=None, count=False):
+        records = self.sort(self.records(model, domain), order)
+        if count:
+            return len(records)
+        records = records[offset:offset + limit] if limit else records[offset:]
+        return [r["id"] for r in records]
+
+    def read(self, model, ids, fields=None):
+        table = self.table(model)
+        ids = [ids] if isinstance(ids, int) else ids
+        missing = [i for i in ids if i not in table]
+        if missing:
+            raise FakeFault("odoo.exceptions.MissingError", "Record does not exist or has been deleted. (Record: %s(%s,))" % (model, missing[0]))
+        return [self.project(table[i], fields) for i in ids]
+
+    def search_read(self, model, domain=None, fields=None, offset=0, limit=None, order=None):
+        return [self.project(r, fields) for r in self.sort(self.records(model, domain), order)[offset:offset + limit if limit else None]]
+
+    def read_group(self, model, domain, fields, groupby, offset=0, limit=None, orderby=False, lazy=True):
+        groupby = [groupby] if isinstance(groupby, str) else list(groupby)
+        group_field = groupby[0]
+        if group_field in NON_STORED.get(model, ()):
+            raise FakeFault("ValueError", "Field %s.%s is not stored, it cannot be grouped by" % (model, group_field))
+        aggregates = []
+        for spec in fields:
+            name, _, func = spec.partition(":")
+            if name != group_field:
+                aggregates.append((name, func or "sum"))
+
+        # lazy groupings count per grouped field, eager ones use a single __count key
+        count_key = "%s_count" % group_field if lazy else "__count"
+        groups = {}
+        for record in self.records(model, domain):
+            key = record.get(group_field, False)
+            group_key = leaf_value(key)
+            group = groups.get(group_key)
+            if group is None:
+                group = groups[group_key] = {group_field: key, count_key: 0, "__domain": [(group_field, "=", group_key)] + list(domain)}
+                for name, _ in aggregates:
+                    group[name] = 0
+            group[count_key] += 1
+            for name, func in aggregates:
+                value = record.get(name) or 0
+                if func == "max":
+                    group[name] = max(group[name], value)
+                elif func == "min":
+                    group[name] = min(group[name], value)
+                else:
+                    group[name] += value
+        result = list(groups.values())
+        return result[offset:offset + limit] if limit else result[offset:]
+
+    def create(self, model, values):
+        with self.lock:
+            if isinstance(values, list):
+                return [self.add(model, dict(v)) for v in values]
+            return self.add(model, dict(values))
+
+    def write(self, model, ids, values):
+        with self.lock:
+            ids = [ids] if isinstance(ids, int) else ids
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for record in self.read(model, ids):
+                self.table(model)[record["id"]].update(values, write_date=now)
+            return True
+
+    def unlink(self, model, ids):
+        with self.lock:
+            for record_id in [ids] if isinstance(ids, int) else ids:
+                self.table(model).pop(record_id, None)
+            return True
+
+    def fields_get(self, model, allfields=None, attributes=None):
+        sample = next(iter(self.table(model).values()), {"id": 0})
+        return {field: {"string": field.replace("_", " ").title(), "type": "char"} for field in sample}
+
+    def execute_kw(self, model, method, args, kwargs=None):
+        kwargs = dict(kwargs or {})
+        if method in ("check_access_rights",):
+            return True
+        if method == "default_get":
+            return {}
+        if method == "search_count":
+            return self.search(model, args[0] if args else [], count=True)
+        handler = getattr(self, method, None)
+        if handler is None or method.startswith("_") or method in ("add", "table", "records", "sort", "project", "execute_kw", "seed_catalog"):
+            raise FakeFault("AttributeError", "The method '%s' does not exist on the model '%s'" % (method, model))
+        return handler(model, *args, **kwargs)
+
+
+class Recorder:
+    """Record real Odoo traffic to a JSON-lines file once, then replay it by exact request match"""
+
+    def __init__(self, path, upstream=None, login=None):
+        self.path = path
+        self.upstream = upstream
+        # used to authenticate upstream when a client calls models with a uid it got elsewhere
+        self.login = login
+        self.responses = {}
+        # real upstream uid per (db, password), clients only ever see FAKE_UID
+        self.uids = {}
+        self.lock = threading.Lock()
+        if upstream is None:
+            with open(path, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.responses[entry["key"]] = entry["result"]
+
+    @staticmethod
+    def key(service, method, args):
+        args = list(args)
+        # never write credentials to the recording
+        if service == "object" and len(args) > 2:
+            args[1], args[2] = FAKE_UID, "***"
+        if service == "common" and method in ("authenticate", "login") and len(args) > 2:
+            args[2] = "***"
+        return json.dumps([service, method, args], sort_keys=True, default=str)
+
+    def lookup(self, service, method, args):
+        return self.responses.get(self.key(service, method, args), None)
+
+    def proxy(self, service):
+        return xmlrpc.client.ServerProxy("%s/xmlrpc/2/%s" % (self.upstream, service), allow_none=True)
+
+    def upstream_uid(self, db, password):
+        with self.lock:
+            uid = self.uids.get((db, password))
+        if uid:
+            return uid
+        if not self.login:
+            raise FakeFault("odoo.exceptions.AccessDenied", "Authenticate through the recorder first or pass --record-login")
+        uid = self.proxy("common").authenticate(db, self.login, password, {})
+        if not uid:
+            raise FakeFault("odoo.exceptions.AccessDenied", "Access Denied")
+        with self.lock:
+            self.uids[(db, password)] = uid
+        return uid
+
+    def forward(self, service, method, args):
+        args = list(args)
+        if service == "object" and len(args) > 2:
+            # the client holds FAKE_UID, upstream needs the uid it handed out
+            args[1] = self.upstream_uid(args[0], args[2])
+        result = getattr(self.proxy(service), method)(*args)
+        if service == "common" and method in ("authenticate", "login") and result:
+            with self.lock:
+                self.uids[(args[0], args[2])] = result
+            result = FAKE_UID
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"key": self.key(service, method, args), "result": result}, default=str) + "\n")
+        return result
+
+
+class FakeOdooServer:
+    def __init__(self, odoo: FakeOdoo, latency_ms=0.0, jitter_ms=0.0, per_record_ms=0.0, error_rate=0.0, fault_rate=0.0, recorder: Recorder = None, seed=None):
+        self.odoo = odoo
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.per_record = per_record_ms / 1000.0
+        self.error_rate = error_rate
+        self.fault_rate = fault_rate
+        self.recorder = recorder
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def dispatch(self, service, method, args):
+        self.calls += 1
+        if self.fault_rate and self.random.random() < self.fault_rate:
+            raise FakeFault("odoo.exceptions.UserError", "Injected fault")
+
+        if self.recorder is not None:
+            if self.recorder.upstream is not None:
+                return self.recorder.forward(service, method, args)
+            recorded = self.recorder.lookup(service, method, args)
+            if recorded is not None:
+                return recorded
+
+        if service == "common":
+            if method in ("authenticate", "login"):
+                return FAKE_UID
+            if method == "version":
+                return {"server_version": "17.0", "server_version_info": [17, 0, 0, "final", 0, ""], "protocol_version": 1}
+            raise FakeFault("AttributeError", "Unknown common method %s" % method)
+        if service == "object":
+            if method == "execute_kw":
+                _, _, _, model, orm_method, orm_args = args[:6]
+                return self.odoo.execute_kw(model, orm_method, orm_args, args[6] if len(args) > 6 else None)
+            if method == "execute":
+                _, _, _, model, orm_method = args[:5]
+                return self.odoo.execute_kw(model, orm_method, list(args[5:]))
+        raise FakeFault("AttributeError", "Unknown service %s.%s" % (service, method))
+
+    def delay(self, result):
+        records = len(result) if isinstance(result, list) else 1
+        seconds = self.latency + self.random.uniform(-self.jitter, self.jitter) + self.per_record * records
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logging.debug(format, *args)
+
+            def send_body(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+
+                if server.error_rate and server.random.random() < server.error_rate:
+                    return self.send_body(503, b"Injected outage", "text/plain")
+
+                if self.path.startswith("/xmlrpc/2/"):
+                    return self.handle_xmlrpc(self.path.rsplit("/", 1)[-1], body)
+                if self.path == "/jsonrpc":
+                    return self.handle_jsonrpc(body)
+                return self.send_body(404, b"Not Found", "text/plain")
+
+            def handle_xmlrpc(self, service, body):
+                args, method = xmlrpc.client.loads(body, use_builtin_types=True)
+                try:
+                    result = server.dispatch(service, method, args)
+                    server.delay(result)
+                    response = xmlrpc.client.dumps((result,), methodresponse=True, allow_none=True)
+                except Exception as e:
+                    e = e if isinstance(e, FakeFault) else FakeFault(type(e).__name__, str(e))
+                    # Odoo reports AccessDenied as fault code 3 and everything else with the exception text
+                    code = 3 if e.name.endswith("AccessDenied") else 1
+                    response = xmlrpc.client.dumps(xmlrpc.client.Fault(code, "%s: %s" % (e.name, e.message)), allow_none=True)
+                self.send_body(200, response.encode("utf-8"), "text/xml")
+
+            def handle_jsonrpc(self, body):
+                request = json.loads(body)
+                params = request.get("params", {})
+                try:
+                    result = server.dispatch(params.get("service"), params.get("method"), params.get("args", []))
+                    server.delay(result)
+                    response = {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+                except Exception as e:
+                    e = e if isinstance(e, FakeFault) else FakeFault(type(e).__name__, str(e))
+                    response = {"jsonrpc": "2.0", "id": request.get("id"), "error": {
+                        "code": 200,
+                        "message": "Odoo Server Error",
+                        "data": {"name": e.name, "message": e.message},
+                    }}
+                self.send_body(200, json.dumps(response, default=str).encode("utf-8"), "application/json")
+
+        return Handler
+
+    def serve(self, host="127.0.0.1", port=8069):
+        httpd = ThreadingHTTPServer((host, port), self.handler())
+        httpd.daemon_threads = True
+        return httpd
+
+
+def start_fake_odoo(port=0, **kwargs):
+    """Start a fake Odoo on a background thread and return (httpd, url), for benchmark scripts"""
+    server_kwargs = {k: kwargs.pop(k) for k in list(kwargs) if k in ("latency_ms", "jitter_ms", "per_record_ms", "error_rate", "fault_rate", "recorder")}
+    server = FakeOdooServer(FakeOdoo(**kwargs), **server_kwargs)
+    httpd = server.serve(port=port)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, "http://%s:%s" % httpd.server_address
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Odoo XML-RPC/JSON-RPC server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8069)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--variants", type=int, default=3)
+    parser.add_argument("--image-kb", type=int, default=0, help="size of each fake image payload")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--per-record-ms", type=float, default=0.0, help="extra latency per returned record")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 503")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="share of calls answered with an Odoo fault")
+    parser.add_argument("--record", metavar="ODOO_URL", help="proxy to a real Odoo and record its answers")
+    parser.add_argument("--replay", metavar="FILE", help="answer from a recording, falling back to the synthetic catalog")
+    parser.add_argument("--recording", default="odoo_recording.jsonl", help="file written in --record mode")
+    parser.add_argument("--record-login", default=os.getenv("ODOO_USER"), help="upstream login for clients that skip authenticate")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    recorder = None
+    if args.record:
+        recorder = Recorder(args.recording, upstream=args.record.rstrip("/"), login=args.record_login)
+    elif args.replay:
+        recorder = Recorder(args.replay)
+
+    odoo = FakeOdoo(products=args.products, variants_per_product=args.variants, image_kb=args.image_kb, seed=args.seed)
+    server = FakeOdooServer(
+        odoo,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        per_record_ms=args.per_record_ms,
+        error_rate=args.error_rate,
+        fault_rate=args.fault_rate,
+        recorder=recorder,
+        seed=args.seed,
+    )
+    httpd = server.serve(args.host, args.port)
+    logging.info("Fake Odoo with %s products listening on http://%s:%s", args.products, args.host, args.port)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # write down a file with current time stamp as iso format
 import datetime
+import json
 import os
 
 
@@ -36,3 +37,17 @@ def read_time_stamp(file_name):
         write_time_stamp(file_name)
         read_time_stamp(file_name)
         
+
+
+def read_json_file(file_name, default=None):
+    path = get_file_name(file_name)
+    if not os.path.exists(path):
+        return default
+    try:
+        return json.loads(read_file(path))
+    except ValueError:
+        return default
+
+
+def write_json_file(file_name, data):
+    write_file(get_file_name(file_name), json.dumps(data))
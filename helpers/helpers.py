@@ -40,4 +40,12 @@ def odooReadSearch(connector: OdooConnector, model, where_clause=(), sFields=[],
         sFields = fields.keys()
         sFields = list(sFields)
     search_ids = connector.search(model, [where_clause], offset=offset, limit=limit)
-    return connector.read(model, search_ids, sFields)
\ No newline at end of file
+    return connector.read(model, search_ids, sFields)
+
+
+def odooIterReadSearch(connector: OdooConnector, model, where_clause=(), sFields=[], page_size=500, limit=0):
+    """Paged, lazy counterpart of odooReadSearch for full-catalog passes"""
+    if not sFields:
+        sFields = list(connector.get_model_fields(model).keys())
+    domain = [where_clause] if where_clause else []
+    return connector.iter_search_read(model, domain, sFields, page_size=page_size, limit=limit)
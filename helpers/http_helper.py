@@ -2,9 +2,14 @@ import json
 from django.http import HttpResponseBadRequest
 
 from helpers import odoo_connector
-from helpers.odoo_connector import OdooConnector
+from helpers.odoo_connector import OdooConnector, shared_connector
+from helpers.odoo_metrics import rpc_metrics
 from helpers.salesorder_helpers import SalesOrderHelper
 from helpers.sql_connector import SQLConnector
+from helpers.sql_metrics import sql_metrics
+
+# request threads share one connector, each call checks out its own pooled connection
+shared_sql_connector = SQLConnector()
 
 
 class HttpHelper: 
@@ -15,13 +20,22 @@ class HttpHelper:
 
     def __init__(self, requestHandler):
         self.requestHandler = requestHandler
-        self.odoo_connector = OdooConnector()
-        self.sql_connector = SQLConnector()
+        self.odoo_connector = shared_connector()
+        self.sql_connector = shared_sql_connector
 
 
 
     def onGET(self, path):
         try: 
+            if path == "/metrics":
+                return self.sendResponse(200, rpc_metrics.to_text(), contentType="text/plain; version=0.0.4")
+
+            if path == "/metrics.json":
+                return self.sendJsonResponse(rpc_metrics.snapshot())
+
+            if path == "/metrics/db.json":
+                return self.sendJsonResponse({"pool": self.sql_connector.pool_stats(), "statements": sql_metrics.snapshot()})
+
             response = {
                 "message": "Success!",
                 "data": {}
@@ -0,0 +1,103 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.odoo_connector import OdooConnector, odoo_configs
+from helpers.odoo_transport import HttpConnectionPool
+
+
+class AsyncOdooConnector:
+    """asyncio front for OdooConnector that keeps up to `concurrency` RPCs in flight.
+
+    Calls run on a dedicated thread pool. Without an explicit connector they go through a connector
+    of their own whose keep-alive pool holds one connection per worker; a connector passed in is
+    used as is. A timed out or cancelled call returns control to
+    the caller straight away; the socket timeout bounds the worker thread that was serving it.
+    """
+
+    def __init__(self, connector: OdooConnector = None, concurrency=None, timeout=None):
+        configs = odoo_configs()
+        self.concurrency = concurrency or configs.max_concurrency
+        self.timeout = timeout or configs.timeout
+        self.own_pool = connector is None
+        if connector is None:
+            # a pool of its own, so sizing it to the workers leaves shared_connector() untouched
+            pool = HttpConnectionPool(configs.url, pool_size=self.concurrency, timeout=configs.timeout)
+            connector = OdooConnector(pool=pool)
+        self.connector = connector
+        self._semaphore = None
+        self._loop = None
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="odoo-rpc")
+
+    @property
+    def semaphore(self):
+        # asyncio primitives are bound to one event loop, and run() starts a new loop per cycle
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def execute_kw(self, model, method, args, kwargs=None, timeout=None, batcher=None, count=0):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            call = self.connector.execute_kw
+            if batcher is not None:
+                # time the RPC itself on the worker thread, not the wait for a free slot
+                call = functools.partial(self._measured, batcher, count, call)
+            future = loop.run_in_executor(self.executor, call, model, method, args, kwargs)
+            return await asyncio.wait_for(future, timeout or self.timeout)
+
+    def _measured(self, batcher, count, call, *args):
+        with batcher.measure(count):
+            return call(*args)
+
+    async def search(self, model, domain, offset=0, limit=0, timeout=None):
+        return await self.execute_kw(model, 'search', [domain], {'offset': offset, 'limit': limit}, timeout=timeout)
+
+    async def read(self, model, ids, fields, timeout=None, batcher=None):
+        return await self.execute_kw(model, 'read', [ids], {'fields': fields}, timeout=timeout, batcher=batcher, count=len(ids))
+
+    async def write(self, model, ids, values, timeout=None):
+        return await self.execute_kw(model, 'write', [ids, values], timeout=timeout)
+
+    async def create(self, model, values, timeout=None):
+        return await self.execute_kw(model, 'create', [values], timeout=timeout)
+
+    async def unlink(self, model, ids, timeout=None):
+        return await self.execute_kw(model, 'unlink', [ids], timeout=timeout)
+
+    async def search_read(self, model, domain, fields, offset=0, limit=0, timeout=None):
+        return await self.execute_kw(model, 'search_read', [domain], {
+            'fields': fields,
+            'offset': offset,
+            'limit': limit
+        }, timeout=timeout)
+
+    async def get_model_fields(self, model, timeout=None):
+        return await self.execute_kw(model, 'fields_get', [], {'attributes': ['string']}, timeout=timeout)
+
+    async def gather(self, calls, return_exceptions=False):
+        """Run coroutines concurrently; unless return_exceptions is set, the first failure cancels the rest"""
+        tasks = [asyncio.ensure_future(call) for call in calls]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def read_batches(self, model, id_batches, fields, return_exceptions=False, batcher=None):
+        return await self.gather(
+            [self.read(model, ids, fields, batcher=batcher) for ids in id_batches],
+            return_exceptions=return_exceptions,
+        )
+
+    def run(self, coroutine):
+        """Entry point for the synchronous runners"""
+        return asyncio.run(coroutine)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.own_pool:
+            self.connector.pool.close_all()
@@ -0,0 +1,110 @@
+import errno
+import gzip
+import http.client
+import itertools
+import json
+import xmlrpc.client
+
+from helpers.odoo_transport import HttpConnectionPool, PooledTransport, response_info
+
+
+class XmlRpcBackend:
+    """Talks to Odoo through /xmlrpc/2/common and /xmlrpc/2/object"""
+
+    name = "xmlrpc"
+
+    def __init__(self, url, pool: HttpConnectionPool, use_gzip=False):
+        self.url = url
+        self.pool = pool
+        self.common = xmlrpc.client.ServerProxy(
+            '{}/xmlrpc/2/common'.format(url),
+            transport=PooledTransport(pool, use_gzip=use_gzip),
+        )
+        self.models = xmlrpc.client.ServerProxy(
+            '{}/xmlrpc/2/object'.format(url),
+            transport=PooledTransport(pool, use_gzip=use_gzip),
+        )
+
+    def authenticate(self, db, username, password):
+        return self.common.authenticate(db, username, password, {})
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        if kwargs is None:
+            return self.models.execute_kw(db, uid, password, model, method, args)
+        return self.models.execute_kw(db, uid, password, model, method, args, kwargs)
+
+
+class JsonRpcBackend:
+    """Talks to Odoo through /jsonrpc, which is cheaper to decode than XML-RPC for large reads"""
+
+    name = "jsonrpc"
+
+    def __init__(self, url, pool: HttpConnectionPool, use_gzip=False):
+        self.url = url
+        self.pool = pool
+        self.use_gzip = use_gzip
+        self._ids = itertools.count(1)
+
+    def call(self, service, method, *args):
+        payload = json.dumps({
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": {"service": service, "method": method, "args": args},
+            "id": next(self._ids),
+        }).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+
+        resp, body = self._post(payload, headers)
+
+        if resp.status != 200:
+            raise xmlrpc.client.ProtocolError(self.url + "/jsonrpc", resp.status, resp.reason, dict(resp.getheaders()))
+        if resp.getheader("Content-Encoding", "") == "gzip":
+            body = gzip.decompress(body)
+
+        response = json.loads(body)
+        error = response.get("error")
+        if error:
+            # surface server errors the same way the XML-RPC backend does, so callers handle one type
+            data = error.get("data") or {}
+            raise xmlrpc.client.Fault(
+                error.get("code", 1),
+                "%s: %s" % (data.get("name", "odoo"), data.get("message") or error.get("message")),
+            )
+        return response.get("result")
+
+    def _post(self, payload, headers):
+        # like xmlrpc.client.Transport.request: a kept-alive connection the server already closed
+        # fails on first use, so retry once on a fresh one
+        for attempt in (0, 1):
+            conn = self.pool.get_connection()
+            reused = conn.sock is not None
+            try:
+                conn.request("POST", "/jsonrpc", body=payload, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+                response_info.bytes = len(body)
+            except (http.client.BadStatusLine, OSError) as e:
+                self.pool.discard_connection(conn)
+                stale = isinstance(e, http.client.BadStatusLine) or e.errno in (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
+                if attempt or not reused or not stale:
+                    raise
+                continue
+            except Exception:
+                self.pool.discard_connection(conn)
+                raise
+            self.pool.return_connection(conn)
+            return resp, body
+
+    def authenticate(self, db, username, password):
+        return self.call("common", "authenticate", db, username, password, {})
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        if kwargs is None:
+            return self.call("object", "execute_kw", db, uid, password, model, method, args)
+        return self.call("object", "execute_kw", db, uid, password, model, method, args, kwargs)
+
+
+backends = {
+    XmlRpcBackend.name: XmlRpcBackend,
+    JsonRpcBackend.name: JsonRpcBackend,
+}
@@ -0,0 +1,80 @@
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from helpers.odoo_transport import response_info
+
+load_dotenv()
+
+
+class AdaptiveBatcher:
+    """Chunk size controller for id batches sent to Odoo.
+
+    Grows the chunk while calls come back well under `target_latency`, shrinks it in proportion
+    when a call runs slow or its payload is too large, and halves it on errors and timeouts.
+    """
+
+    def __init__(self, name, initial=None, min_size=None, max_size=None, target_latency=None, max_payload_bytes=None):
+        self.name = name
+        self.min_size = min_size or int(os.getenv("ODOO_BATCH_MIN", "5"))
+        self.max_size = max_size or int(os.getenv("ODOO_BATCH_MAX", "200"))
+        self.target_latency = target_latency or float(os.getenv("ODOO_BATCH_TARGET_LATENCY", "2.0"))
+        self.max_payload_bytes = max_payload_bytes or int(os.getenv("ODOO_BATCH_MAX_BYTES", "4000000"))
+        self.size = min(max(initial or self.min_size, self.min_size), self.max_size)
+        self.lock = threading.Lock()
+
+    def chunks(self, items):
+        """Slice items, a list or any iterable, into lists of the current size, which may change between slices"""
+        items = iter(items)
+        while True:
+            chunk = list(itertools.islice(items, self.size))
+            if not chunk:
+                return
+            yield chunk
+
+    @contextmanager
+    def measure(self, count):
+        """Time the enclosed Odoo calls and size their responses, both read on the calling thread"""
+        started = time.perf_counter()
+        bytes_before = getattr(response_info, "total_bytes", 0)
+        try:
+            yield
+        except Exception:
+            self.record(count, time.perf_counter() - started, error=True)
+            raise
+        payload_bytes = getattr(response_info, "total_bytes", 0) - bytes_before
+        self.record(count, time.perf_counter() - started, payload_bytes=payload_bytes or None)
+
+    def record(self, count, seconds, error=False, payload_bytes=None):
+        with self.lock:
+            previous = self.size
+            if error:
+                size = self.size // 2
+            elif seconds > self.target_latency:
+                size = int(count * self.target_latency / seconds)
+            elif payload_bytes and payload_bytes > self.max_payload_bytes:
+                size = int(count * self.max_payload_bytes / payload_bytes)
+            elif count >= self.size and seconds < self.target_latency / 2:
+                # only grow on full chunks, a short tail says nothing about the ceiling
+                size = int(self.size * 1.25) + 1
+            else:
+                size = self.size
+            self.size = min(max(size, self.min_size), self.max_size)
+            if self.size != previous:
+                print(f"[batcher.{self.name}] chunk size {previous} → {self.size} ({count} ids in {seconds:.2f}s{', error' if error else ''})")
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(name, initial=None, **kwargs) -> AdaptiveBatcher:
+    """Process-wide batcher per loop, so the learned size carries over between sync cycles"""
+    with _batchers_lock:
+        if name not in _batchers:
+            _batchers[name] = AdaptiveBatcher(name, initial=initial, **kwargs)
+        return _batchers[name]
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecordCache:
+    """Read-through LRU cache for rarely changing Odoo records (taxes, units, attribute values).
+
+    Records are cached per (model, fields, id) so a read with a mix of known and unknown ids only
+    fetches the unknown ones.
+    """
+
+    def __init__(self, ttls, max_size=5000):
+        # model -> TTL in seconds, only these models are cached
+        self.ttls = dict(ttls)
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def handles(self, model):
+        return model in self.ttls
+
+    def read(self, model, ids, fields, fetch):
+        single = isinstance(ids, int)
+        ids = [ids] if single else list(ids)
+        fields_key = tuple(sorted(fields or []))
+        now = time.time()
+
+        found = {}
+        with self.lock:
+            for record_id in ids:
+                key = (model, fields_key, record_id)
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self.entries.move_to_end(key)
+                    found[record_id] = entry[1]
+                elif entry is not None:
+                    del self.entries[key]
+            hits = len([i for i in ids if i in found])
+            self.hits[model] = self.hits.get(model, 0) + hits
+            self.misses[model] = self.misses.get(model, 0) + len(ids) - hits
+
+        missing = list(dict.fromkeys(i for i in ids if i not in found))
+        if missing:
+            records = fetch(missing)
+            expires_at = time.time() + self.ttls[model]
+            with self.lock:
+                for record in records:
+                    found[record['id']] = record
+                    self.entries[(model, fields_key, record['id'])] = (expires_at, record)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+
+        # hand out copies so callers cannot mutate the cached record
+        return [dict(found[i]) for i in ids if i in found]
+
+    def invalidate(self, model=None, ids=None):
+        if isinstance(ids, int):
+            ids = [ids]
+        with self.lock:
+            if model is None:
+                self.entries.clear()
+                return
+            ids = set(ids) if ids is not None else None
+            for key in [k for k in self.entries if k[0] == model and (ids is None or k[2] in ids)]:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "models": {
+                    model: {
+                        "ttl": ttl,
+                        "hits": self.hits.get(model, 0),
+                        "misses": self.misses.get(model, 0),
+                    }
+                    for model, ttl in self.ttls.items()
+                },
+            }
@@ -1,72 +1,285 @@
 
 import os
-
+import threading
+import time
 import xmlrpc.client
 
 from dotenv import load_dotenv
 
+from helpers.odoo_backends import backends
+from helpers.odoo_cache import RecordCache
+from helpers.odoo_governor import OdooGovernor, odoo_governor
+from helpers.odoo_loader import OdooReadLoader
+from helpers.odoo_metadata import OdooMetadataCache
+from helpers.odoo_metrics import RpcMetrics, rpc_metrics
+from helpers.odoo_transport import HttpConnectionPool, response_info
+
 load_dotenv()
 
+# model:ttl_seconds pairs for reference data that is re-read for every product
+DEFAULT_RECORD_CACHE_MODELS = "account.tax:600,uom.uom:3600,product.attribute:600,product.attribute.value:600"
+
+
+def parse_model_ttls(value):
+    ttls = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        model, _, ttl = item.strip().partition(":")
+        ttls[model] = float(ttl or 300)
+    return ttls
+
+
 class odoo_configs:
     url = os.getenv("ODOO_URL")
     db = os.getenv("ODOO_DB")
     username = os.getenv("ODOO_USER")
     password = os.getenv("ODOO_PASS")
+    pool_size = int(os.getenv("ODOO_POOL_SIZE", "4"))
+    timeout = float(os.getenv("ODOO_TIMEOUT", "60"))
+    use_gzip = os.getenv("ODOO_GZIP", "false").lower() in ("1", "true", "yes")
+    protocol = os.getenv("ODOO_PROTOCOL", "xmlrpc").lower()
+    read_batch_window = float(os.getenv("ODOO_READ_BATCH_WINDOW", "0"))
+    max_concurrency = int(os.getenv("ODOO_MAX_CONCURRENCY", "8"))
+    metadata_ttl = float(os.getenv("ODOO_METADATA_TTL", "86400"))
+    metadata_cache_path = os.getenv("ODOO_METADATA_CACHE_PATH")
+    record_cache_models = os.getenv("ODOO_RECORD_CACHE_MODELS", DEFAULT_RECORD_CACHE_MODELS)
+    record_cache_size = int(os.getenv("ODOO_RECORD_CACHE_SIZE", "5000"))
     
     def __init__(self):
         self.url = os.getenv("ODOO_URL")
         self.db =  os.getenv("ODOO_DB")
         self.username = os.getenv("ODOO_USER")
         self.password = os.getenv("ODOO_PASS")
+        self.pool_size = int(os.getenv("ODOO_POOL_SIZE", "4"))
+        self.timeout = float(os.getenv("ODOO_TIMEOUT", "60"))
+        self.use_gzip = os.getenv("ODOO_GZIP", "false").lower() in ("1", "true", "yes")
+        self.protocol = os.getenv("ODOO_PROTOCOL", "xmlrpc").lower()
+        self.read_batch_window = float(os.getenv("ODOO_READ_BATCH_WINDOW", "0"))
+        self.max_concurrency = int(os.getenv("ODOO_MAX_CONCURRENCY", "8"))
+        self.metadata_ttl = float(os.getenv("ODOO_METADATA_TTL", "86400"))
+        self.metadata_cache_path = os.getenv("ODOO_METADATA_CACHE_PATH")
+        self.record_cache_models = os.getenv("ODOO_RECORD_CACHE_MODELS", DEFAULT_RECORD_CACHE_MODELS)
+        self.record_cache_size = int(os.getenv("ODOO_RECORD_CACHE_SIZE", "5000"))
         pass
 
+
+def is_access_denied(fault: xmlrpc.client.Fault):
+    # Odoo answers AccessDenied with fault code 3 over XML-RPC and by exception name over JSON-RPC
+    return fault.faultCode == 3 or "AccessDenied" in str(fault.faultString)
+
+
+def count_records(result, args):
+    # reads and searches return one entry per record, writes report on the ids they were given
+    if isinstance(result, list):
+        return len(result)
+    if args and isinstance(args[0], list):
+        return len(args[0])
+    return 1 if result else 0
+
+
 class OdooConnector:
-    def __init__(self):
-        self.url = odoo_configs().url
-        self.db = odoo_configs().db
-        self.username = odoo_configs().username
-        self.password = odoo_configs().password
-        self.common = xmlrpc.client.ServerProxy('{}/xmlrpc/2/common'.format(self.url))
-        self.uid = self.common.authenticate(self.db, self.username, self.password, {})
-        self.models = xmlrpc.client.ServerProxy('{}/xmlrpc/2/object'.format(self.url))
+    def __init__(self, pool: HttpConnectionPool = None, protocol=None, metrics: RpcMetrics = None, governor: OdooGovernor = None):
+        configs = odoo_configs()
+        self.url = configs.url
+        self.db = configs.db
+        self.username = configs.username
+        self.password = configs.password
+        # common and object endpoints share one keep-alive pool to the same host
+        self.pool = pool or HttpConnectionPool(self.url, pool_size=configs.pool_size, timeout=configs.timeout)
+        protocol = protocol or configs.protocol
+        if protocol not in backends:
+            raise Exception("Unknown ODOO_PROTOCOL %s, expected one of %s" % (protocol, ", ".join(backends)))
+        self.protocol = protocol
+        self.backend = backends[protocol](self.url, self.pool, use_gzip=configs.use_gzip)
+        # authentication is deferred to the first call and cached for the life of the connector
+        self._uid = None
+        self._auth_lock = threading.Lock()
+        self.loader = OdooReadLoader(self, window=configs.read_batch_window)
+        self.metadata = OdooMetadataCache(self, ttl=configs.metadata_ttl, path=configs.metadata_cache_path)
+        self.metrics = metrics or rpc_metrics
+        self.governor = governor or odoo_governor
+        self.record_cache = RecordCache(parse_model_ttls(configs.record_cache_models), max_size=configs.record_cache_size)
+
+    @property
+    def uid(self):
+        if self._uid is None:
+            self.authenticate(force=False)
+        return self._uid
+
+    def authenticate(self, force=True):
+        with self._auth_lock:
+            if not force and self._uid is not None:
+                return self._uid
+            uid = self._instrumented('common', 'authenticate', [], self.backend.authenticate, self.db, self.username, self.password)
+            if not uid:
+                raise Exception("Odoo authentication failed for %s on %s" % (self.username, self.db))
+            self._uid = uid
+            return uid
+
+    def connection_stats(self):
+        """Reuse counts of the keep-alive connections behind this connector"""
+        return self.pool.stats()
+
+    def execute_kw(self, model, method, args, kwargs=None):
+        uid = self.uid
+        try:
+            return self._instrumented(model, method, args, self.backend.execute_kw, self.db, uid, self.password, model, method, args, kwargs)
+        except xmlrpc.client.Fault as e:
+            if not is_access_denied(e):
+                raise
+            # session was invalidated server side (user recreated, database restored), log in again once
+            uid = self.authenticate()
+            return self._instrumented(model, method, args, self.backend.execute_kw, self.db, uid, self.password, model, method, args, kwargs)
+
+    def _instrumented(self, model, method, args, call, *call_args):
+        with self.governor.slot():
+            response_info.bytes = 0
+            result = None
+            error = None
+            started = time.perf_counter()
+            try:
+                result = call(*call_args)
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                response_bytes = getattr(response_info, "bytes", 0)
+                response_info.total_bytes = getattr(response_info, "total_bytes", 0) + response_bytes
+                self.metrics.record(
+                    model,
+                    method,
+                    time.perf_counter() - started,
+                    records=count_records(result, args),
+                    response_bytes=response_bytes,
+                    error=error,
+                )
 
     def search(self, model, domain, offset=0, limit=0):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'search', [domain], {'offset': offset, 'limit': limit})
+        return self.execute_kw(model, 'search', [domain], {'offset': offset, 'limit': limit})
 
     def read(self, model, ids, fields):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'read', [ids], {'fields': fields})
+        if self.record_cache.handles(model):
+            return self.record_cache.read(model, ids, fields, lambda missing: self._read(model, missing, fields))
+        return self._read(model, ids, fields)
+
+    def _read(self, model, ids, fields):
+        if self.loader.window > 0:
+            return self.loader.read(model, ids, fields)
+        return self.execute_kw(model, 'read', [ids], {'fields': fields})
 
     def write(self, model, ids, values):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'write', [ids, values])
+        if self.record_cache.handles(model):
+            self.record_cache.invalidate(model, ids)
+        return self.execute_kw(model, 'write', [ids, values])
 
     def create(self, model, values):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'create', [values])
+        return self.execute_kw(model, 'create', [values])
 
     def unlink(self, model, ids):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'unlink', [ids])
+        if self.record_cache.handles(model):
+            self.record_cache.invalidate(model, ids)
+        return self.execute_kw(model, 'unlink', [ids])
+
+    def cache_stats(self):
+        """Hit/miss counters of the reference record cache"""
+        return self.record_cache.stats()
 
     def get_model_fields(self, model):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'fields_get', [], {'attributes': ['string']})
+        return self.metadata.get(model, 'fields_string', lambda: self.execute_kw(model, 'fields_get', [], {'attributes': ['string']}))
 
     def search_read(self, model, domain, fields, offset=0, limit=0):
         """Search and read records in one call"""
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'search_read', [domain], {
+        return self.execute_kw(model, 'search_read', [domain], {
             'fields': fields,
             'offset': offset,
             'limit': limit
         })
 
+    def iter_search_read(self, model, domain, fields, page_size=500, pages=False, limit=0):
+        """Lazily walk every matching record in id order, one page per RPC.
+
+        Pages are fetched with `id > last_id` rather than offsets, so each page costs the same
+        however deep the scan is and records created mid-scan cannot shift the window.
+        """
+        fields = list(fields)
+        if fields and 'id' not in fields:
+            fields.append('id')
+        last_id = 0
+        remaining = limit
+        while True:
+            size = min(page_size, remaining) if limit else page_size
+            if size <= 0:
+                # limit 0 (Odoo's "no limit") must never reach search_read from inside the walk
+                return
+            page = self.execute_kw(model, 'search_read', [list(domain) + [('id', '>', last_id)]], {
+                'fields': fields,
+                'limit': size,
+                'order': 'id asc',
+            })
+            if not page:
+                return
+            last_id = page[-1]['id']
+            if pages:
+                yield page
+            else:
+                yield from page
+            if limit:
+                remaining -= len(page)
+                if remaining <= 0:
+                    return
+            if len(page) < size:
+                return
+
     def get_model_domain(self, model):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'fields_get', [], {'attributes': ['domain']})
+        return self.metadata.get(model, 'fields_domain', lambda: self.execute_kw(model, 'fields_get', [], {'attributes': ['domain']}))
 
     def get_model_constraints(self, model):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'fields_get', [], {'attributes': ['constraints']})
+        return self.metadata.get(model, 'fields_constraints', lambda: self.execute_kw(model, 'fields_get', [], {'attributes': ['constraints']}))
 
     def get_model_defaults(self, model):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'default_get', [])
+        return self.metadata.get(model, 'defaults', lambda: self.execute_kw(model, 'default_get', []))
 
     def get_model_access(self, model):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'check_access_rights', ['write', False])
+        return self.execute_kw(model, 'check_access_rights', ['write', False])
 
     def get_model_access_create(self, model):
-        return self.models.execute_kw(self.db, self.uid, self.password, model, 'check_access_rights', ['create', False])
+        return self.execute_kw(model, 'check_access_rights', ['create', False])
+
+
+class OdooSessionRegistry:
+    """Process-wide OdooConnector per protocol, shared by the HTTP handlers and the runners"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'initialized'):
+            self.sessions = {}
+            self.lock = threading.Lock()
+            self.initialized = True
+
+    def get_connector(self, protocol=None):
+        protocol = protocol or odoo_configs().protocol
+        with self.lock:
+            if protocol not in self.sessions:
+                self.sessions[protocol] = OdooConnector(protocol=protocol)
+            return self.sessions[protocol]
+
+    def reset(self):
+        with self.lock:
+            for connector in self.sessions.values():
+                connector.pool.close_all()
+            self.sessions.clear()
+
+
+def shared_connector(protocol=None) -> OdooConnector:
+    return OdooSessionRegistry().get_connector(protocol)
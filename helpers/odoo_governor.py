@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+import xmlrpc.client
+from collections import deque
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class OdooUnavailable(Exception):
+    """Raised without calling Odoo while the circuit breaker is open or no slot frees up in time"""
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        # rate <= 0 disables limiting for the lane
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise OdooUnavailable("Odoo rate limit wait exceeded")
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after too many failed or slow calls in the recent window, then lets one probe through.
+
+    Only the probe's own result closes or reopens the circuit; calls that started before it opened
+    and finish while it is not closed are ignored.
+    """
+
+    def __init__(self, error_rate=0.5, slow_seconds=10.0, window=20, min_calls=10, cooldown=30.0):
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.outcomes = deque(maxlen=window)
+        self.state = "closed"
+        self.opened_at = None
+        # token of the call currently probing a half-open circuit
+        self.probe = None
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """None while closed, otherwise the probe token to hand back to after_call/cancel_probe"""
+        with self.lock:
+            if self.state == "closed":
+                return None
+            if self.state == "open" and time.monotonic() - self.opened_at < self.cooldown:
+                raise OdooUnavailable("Odoo circuit open, failing fast for %.0fs" % (self.cooldown - (time.monotonic() - self.opened_at)))
+            if self.probe is not None:
+                raise OdooUnavailable("Odoo circuit half-open, probe call in progress")
+            self.state = "half_open"
+            self.probe = object()
+            return self.probe
+
+    def cancel_probe(self, probe):
+        # the probe never reached Odoo (rate limit, no slot), let the next call probe instead
+        with self.lock:
+            if probe is not None and probe is self.probe:
+                self.probe = None
+
+    def after_call(self, seconds, error=None, probe=None):
+        # application faults (validation, access rules) mean Odoo is answering, only transport trouble counts
+        failed = error is not None and not isinstance(error, xmlrpc.client.Fault)
+        bad = failed or seconds >= self.slow_seconds
+        with self.lock:
+            if self.state != "closed":
+                if probe is None or probe is not self.probe:
+                    # started before the circuit opened, says nothing about Odoo now
+                    return
+                self.probe = None
+                if bad:
+                    self._open()
+                else:
+                    self.state = "closed"
+                    self.outcomes.clear()
+                    print("[odoo.breaker] circuit closed, Odoo recovered")
+                return
+            self.outcomes.append(bad)
+            if len(self.outcomes) >= self.min_calls and sum(self.outcomes) / len(self.outcomes) >= self.error_rate:
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        print(f"[odoo.breaker] circuit open, failing fast for {self.cooldown:.0f}s")
+
+
+class OdooGovernor:
+    """Caps in-flight Odoo calls for the process and keeps background sync from starving order requests.
+
+    Background calls may only use `max_in_flight - interactive_reserved` slots and always yield to
+    waiting interactive calls; each lane also has its own token-bucket rate limit.
+    """
+
+    def __init__(self, max_in_flight=16, interactive_reserved=2, rates=None, breaker: CircuitBreaker = None, slot_timeout=30.0, default_lane=BACKGROUND):
+        self.max_in_flight = max_in_flight
+        self.interactive_reserved = min(interactive_reserved, max_in_flight - 1)
+        self.buckets = {lane: TokenBucket(rate) for lane, rate in (rates or {}).items()}
+        self.breaker = breaker or CircuitBreaker()
+        self.slot_timeout = slot_timeout
+        self.default_lane = default_lane
+        self.in_flight = 0
+        self.waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.condition = threading.Condition()
+        self._local = threading.local()
+
+    @contextmanager
+    def lane(self, name):
+        """Run the enclosed Odoo calls from this thread in the given lane"""
+        previous = getattr(self._local, "lane", None)
+        self._local.lane = name
+        try:
+            yield
+        finally:
+            self._local.lane = previous
+
+    def current_lane(self):
+        return getattr(self._local, "lane", None) or self.default_lane
+
+    def _can_start(self, lane):
+        if lane == INTERACTIVE:
+            return self.in_flight < self.max_in_flight
+        return self.waiting[INTERACTIVE] == 0 and self.in_flight < self.max_in_flight - self.interactive_reserved
+
+    @contextmanager
+    def slot(self):
+        lane = self.current_lane()
+        probe = self.breaker.before_call()
+        deadline = time.monotonic() + self.slot_timeout
+        try:
+            bucket = self.buckets.get(lane)
+            if bucket is not None:
+                bucket.acquire(deadline)
+
+            with self.condition:
+                self.waiting[lane] = self.waiting.get(lane, 0) + 1
+                try:
+                    while not self._can_start(lane):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise OdooUnavailable("No Odoo call slot free within %.0fs (%s lane)" % (self.slot_timeout, lane))
+                        self.condition.wait(remaining)
+                finally:
+                    self.waiting[lane] -= 1
+                self.in_flight += 1
+        except OdooUnavailable:
+            self.breaker.cancel_probe(probe)
+            raise
+
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+            self.breaker.after_call(time.monotonic() - started, error, probe)
+
+    def stats(self):
+        with self.condition:
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "waiting": dict(self.waiting),
+                "breaker": self.breaker.state,
+            }
+
+
+def _rate(name, default):
+    return float(os.getenv(name, default))
+
+
+# one governor per process, shared by every connector so the cap covers all of them
+odoo_governor = OdooGovernor(
+    max_in_flight=int(os.getenv("ODOO_MAX_IN_FLIGHT", "16")),
+    interactive_reserved=int(os.getenv("ODOO_INTERACTIVE_RESERVED", "2")),
+    rates={
+        INTERACTIVE: _rate("ODOO_RATE_INTERACTIVE", "0"),
+        BACKGROUND: _rate("ODOO_RATE_BACKGROUND", "20"),
+    },
+    breaker=CircuitBreaker(
+        error_rate=float(os.getenv("ODOO_BREAKER_ERROR_RATE", "0.5")),
+        slow_seconds=float(os.getenv("ODOO_BREAKER_SLOW_SECONDS", "10")),
+        cooldown=float(os.getenv("ODOO_BREAKER_COOLDOWN", "30")),
+    ),
+    slot_timeout=float(os.getenv("ODOO_SLOT_TIMEOUT", "30")),
+    default_lane=os.getenv("ODOO_DEFAULT_LANE", BACKGROUND),
+)
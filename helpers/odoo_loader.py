@@ -0,0 +1,107 @@
+import threading
+import time
+import xmlrpc.client
+
+
+class PendingRead:
+    """Handle for ids queued on an OdooReadLoader, resolved when the merged read for its key runs"""
+
+    def __init__(self, loader, key, ids):
+        self.loader = loader
+        self.key = key
+        self.ids = list(ids)
+        self.records = None
+        self.error = None
+        self.event = threading.Event()
+
+    def resolve(self, by_id):
+        self.records = [by_id[i] for i in self.ids if i in by_id]
+        self.event.set()
+
+    def fail(self, error):
+        self.error = error
+        self.event.set()
+
+    def result(self):
+        if not self.event.is_set():
+            self.loader.dispatch(self.key)
+            self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.records
+
+
+class OdooReadLoader:
+    """Coalesces read(model, ids, fields) calls into one RPC per model and field set.
+
+    Sequential code queues reads with load() and resolves them together; concurrent callers of
+    read() that arrive within `window` seconds of each other share a single merged read.
+    """
+
+    def __init__(self, connector, window=0.0, max_batch=500):
+        self.connector = connector
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = {}
+        self.lock = threading.Lock()
+
+    def load(self, model, ids, fields):
+        if isinstance(ids, int):
+            ids = [ids]
+        key = (model, tuple(sorted(fields or [])))
+        pending = PendingRead(self, key, ids)
+        with self.lock:
+            self.queue.setdefault(key, []).append(pending)
+        return pending
+
+    def read(self, model, ids, fields):
+        pending = self.load(model, ids, fields)
+        if self.window > 0:
+            if self._is_first(pending):
+                # the first caller holds the batch open so concurrent callers can join it
+                deadline = time.monotonic() + self.window
+                while time.monotonic() < deadline and self._queued_ids(pending.key) < self.max_batch:
+                    time.sleep(self.window / 10)
+                self.dispatch(pending.key)
+            else:
+                pending.event.wait(self.window * 2)
+        return pending.result()
+
+    def dispatch(self, key=None):
+        with self.lock:
+            keys = [key] if key is not None else list(self.queue)
+            batches = [(k, self.queue.pop(k)) for k in keys if k in self.queue]
+        for (model, fields), pendings in batches:
+            self._run(model, list(fields), pendings)
+
+    def _run(self, model, fields, pendings):
+        ids = list(dict.fromkeys(i for pending in pendings for i in pending.ids))
+        try:
+            records = []
+            for i in range(0, len(ids), self.max_batch):
+                records.extend(self.connector.execute_kw(model, 'read', [ids[i:i + self.max_batch]], {'fields': fields}))
+        except xmlrpc.client.Fault as e:
+            if len(pendings) == 1:
+                pendings[0].fail(e)
+                return
+            # one bad id (deleted record, access rule) must not fail every caller in the batch
+            for pending in pendings:
+                self._run(model, fields, [pending])
+            return
+        except Exception as e:
+            for pending in pendings:
+                pending.fail(e)
+            return
+
+        by_id = {record['id']: record for record in records}
+        for pending in pendings:
+            pending.resolve(by_id)
+
+    def _is_first(self, pending):
+        with self.lock:
+            queued = self.queue.get(pending.key)
+            return bool(queued) and queued[0] is pending
+
+    def _queued_ids(self, key):
+        with self.lock:
+            return sum(len(pending.ids) for pending in self.queue.get(key, []))
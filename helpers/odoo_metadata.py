@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class OdooMetadataCache:
+    """fields_get / default_get results keyed by model, with a TTL and optional JSON file persistence.
+
+    Entries are dropped wholesale when the installed module versions on the Odoo side change,
+    since that is the only time a model's schema moves.
+    """
+
+    def __init__(self, connector, ttl=86400, path=None):
+        self.connector = connector
+        self.ttl = ttl
+        self.path = path
+        self.entries = {}
+        self.fingerprint = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+        if self.path:
+            self._load()
+
+    def get(self, model, kind, fetch):
+        key = "%s:%s" % (model, kind)
+        with self.lock:
+            self._check_fingerprint()
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+                return entry["value"]
+
+        value = fetch()
+        with self.lock:
+            self.entries[key] = {"fetched_at": time.time(), "value": value}
+            self._save()
+        return value
+
+    def invalidate(self, model=None):
+        with self.lock:
+            if model is None:
+                self.entries.clear()
+            else:
+                self.entries = {k: v for k, v in self.entries.items() if not k.startswith(model + ":")}
+            self._save()
+
+    def module_fingerprint(self):
+        try:
+            modules = self.connector.execute_kw(
+                'ir.module.module', 'search_read',
+                [[('state', '=', 'installed')]],
+                {'fields': ['name', 'latest_version']},
+            )
+        except Exception as e:
+            print(f"[metadata] module version check failed, relying on TTL only: {str(e)}")
+            return None
+        versions = sorted("%s=%s" % (m['name'], m['latest_version']) for m in modules)
+        return hashlib.sha1("\n".join(versions).encode("utf-8")).hexdigest()
+
+    def _check_fingerprint(self):
+        # module upgrades are rare, re-check at most once per TTL
+        if self.checked_at is not None and time.time() - self.checked_at < self.ttl:
+            return
+        fingerprint = self.module_fingerprint()
+        self.checked_at = time.time()
+        if fingerprint is not None and fingerprint != self.fingerprint:
+            if self.fingerprint is not None or self.entries:
+                print("[metadata] Odoo modules changed, dropping cached schema")
+            self.entries.clear()
+            self.fingerprint = fingerprint
+            self._save()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.fingerprint = data.get("fingerprint")
+            self.entries = data.get("entries", {})
+        except (OSError, ValueError) as e:
+            print(f"[metadata] ignoring unreadable cache {self.path}: {str(e)}")
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"fingerprint": self.fingerprint, "entries": self.entries}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[metadata] failed to persist cache {self.path}: {str(e)}")
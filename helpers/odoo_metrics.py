@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# upper bounds in seconds, the last bucket catches everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bucket bound holding the q-th observation"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {str(b): c for b, c in zip(list(self.buckets) + ["+Inf"], self.counts)},
+        }
+
+
+class RpcStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.records = 0
+        self.response_bytes = 0
+        self.latency = Histogram()
+
+
+class RpcMetrics:
+    """In-process timings of every Odoo RPC, keyed by model and method"""
+
+    def __init__(self, slow_threshold=None):
+        self.slow_threshold = slow_threshold
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, model, method, seconds, records=0, response_bytes=0, error=None):
+        with self.lock:
+            stats = self.stats.get((model, method))
+            if stats is None:
+                stats = self.stats[(model, method)] = RpcStats()
+            stats.calls += 1
+            stats.records += records
+            stats.response_bytes += response_bytes
+            stats.latency.observe(seconds)
+            if error is not None:
+                stats.errors += 1
+
+        if self.slow_threshold and seconds >= self.slow_threshold:
+            print(
+                f"[odoo.slow] {model}.{method} took {seconds:.2f}s "
+                f"(records={records}, bytes={response_bytes}{', error=' + str(error) if error is not None else ''})"
+            )
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "%s.%s" % (model, method): {
+                    "model": model,
+                    "method": method,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "records": stats.records,
+                    "response_bytes": stats.response_bytes,
+                    "latency": stats.latency.to_dict(),
+                }
+                for (model, method), stats in sorted(self.stats.items())
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_text(self):
+        """Prometheus text exposition format"""
+        counters = (
+            ("odoo_rpc_calls_total", "calls"),
+            ("odoo_rpc_errors_total", "errors"),
+            ("odoo_rpc_records_total", "records"),
+            ("odoo_rpc_response_bytes_total", "response_bytes"),
+        )
+        with self.lock:
+            items = [('model="%s",method="%s"' % key, stats) for key, stats in sorted(self.stats.items())]
+            lines = []
+            # every sample of a metric family has to follow its TYPE line as one group
+            for name, attribute in counters:
+                lines.append("# TYPE %s counter" % name)
+                for labels, stats in items:
+                    lines.append("%s{%s} %d" % (name, labels, getattr(stats, attribute)))
+            lines.append("# TYPE odoo_rpc_duration_seconds histogram")
+            for labels, stats in items:
+                histogram = stats.latency
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append('odoo_rpc_duration_seconds_bucket{%s,le="%s"} %d' % (labels, bound, cumulative))
+                lines.append("odoo_rpc_duration_seconds_sum{%s} %f" % (labels, histogram.sum))
+                lines.append("odoo_rpc_duration_seconds_count{%s} %d" % (labels, histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+
+
+def _slow_threshold():
+    value = os.getenv("ODOO_SLOW_CALL_SECONDS")
+    return float(value) if value else None
+
+
+# shared by every connector in the process so the HTTP server and runners report one view
+rpc_metrics = RpcMetrics(slow_threshold=_slow_threshold())
@@ -0,0 +1,135 @@
+import http.client
+import threading
+import xmlrpc.client
+from urllib.parse import urlparse
+
+# size of the last response body read on this thread, picked up by the RPC metrics;
+# total_bytes keeps adding up every instrumented call on the thread for the batchers
+response_info = threading.local()
+
+
+class HttpConnectionPool:
+    """Keep-alive HTTP(S) connections to a single Odoo host, shared between threads"""
+
+    def __init__(self, url, pool_size=4, timeout=60, context=None):
+        parsed = urlparse(url)
+        self.scheme = parsed.scheme or "http"
+        self.host = parsed.netloc
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.context = context
+        self.pool = []
+        self.lock = threading.Lock()
+        self._uses = {}
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _create_connection(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout, context=self.context)
+        return http.client.HTTPConnection(self.host, timeout=self.timeout)
+
+    def get_connection(self):
+        with self.lock:
+            if self.pool:
+                conn = self.pool.pop()
+                self.reused += 1
+            else:
+                # Every caller gets a connection; only pool_size of them are kept alive on return
+                conn = self._create_connection()
+                self.opened += 1
+            self._uses[id(conn)] = self._uses.get(id(conn), 0) + 1
+            return conn
+
+    def return_connection(self, conn):
+        with self.lock:
+            if conn.sock is not None and len(self.pool) < self.pool_size:
+                self.pool.append(conn)
+                return
+        self.discard_connection(conn)
+
+    def discard_connection(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.lock:
+            self._uses.pop(id(conn), None)
+            self.discarded += 1
+
+    def close_all(self):
+        with self.lock:
+            idle = list(self.pool)
+            self.pool.clear()
+        for conn in idle:
+            self.discard_connection(conn)
+
+    def stats(self):
+        """Per-connection request counts plus pool-wide open/reuse totals"""
+        with self.lock:
+            return {
+                "host": self.host,
+                "pool_size": self.pool_size,
+                "open": len(self._uses),
+                "idle": len(self.pool),
+                "opened": self.opened,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "connections": [{"id": key, "requests": count} for key, count in self._uses.items()],
+            }
+
+
+class PooledTransport(xmlrpc.client.Transport):
+    """XML-RPC transport that checks connections out of a HttpConnectionPool instead of opening one per call"""
+
+    def __init__(self, pool: HttpConnectionPool, use_gzip=False, gzip_threshold=1400, **kwargs):
+        super().__init__(**kwargs)
+        self.connection_pool = pool
+        # responses are always accepted gzipped, requests are only compressed when asked to
+        self.encode_threshold = gzip_threshold if use_gzip else None
+
+    def single_request(self, host, handler, request_body, verbose=False):
+        conn = self.connection_pool.get_connection()
+        try:
+            self._send(conn, host, handler, request_body, verbose)
+            resp = conn.getresponse()
+            response_info.bytes = int(resp.getheader("content-length", 0) or 0)
+            if resp.status == 200:
+                self.verbose = verbose
+                result = self.parse_response(resp)
+                self.connection_pool.return_connection(conn)
+                return result
+        except xmlrpc.client.Fault:
+            # faults arrive as a complete 200 response, so the connection is still usable
+            self.connection_pool.return_connection(conn)
+            raise
+        except Exception:
+            # unexpected errors leave the connection in a strange state, drop it
+            self.connection_pool.discard_connection(conn)
+            raise
+
+        if resp.getheader("content-length", ""):
+            resp.read()
+            self.connection_pool.return_connection(conn)
+        else:
+            self.connection_pool.discard_connection(conn)
+        raise xmlrpc.client.ProtocolError(host + handler, resp.status, resp.reason, dict(resp.getheaders()))
+
+    def _send(self, conn, host, handler, request_body, debug):
+        _, extra_headers, _ = self.get_host_info(host)
+        headers = self._headers + extra_headers
+        if debug:
+            conn.set_debuglevel(1)
+        if self.accept_gzip_encoding and xmlrpc.client.gzip:
+            conn.putrequest("POST", handler, skip_accept_encoding=True)
+            headers.append(("Accept-Encoding", "gzip"))
+        else:
+            conn.putrequest("POST", handler)
+        headers.append(("Content-Type", "text/xml"))
+        headers.append(("User-Agent", self.user_agent))
+        self.send_headers(conn, headers)
+        self.send_content(conn, request_body)
+
+    def close(self):
+        self.connection_pool.close_all()
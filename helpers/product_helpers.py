@@ -7,6 +7,9 @@ from helpers.helpers import slugify
 from helpers.odoo_connector import OdooConnector
 from helpers.sql_connector import SQLConnector
 
+# main image plus the gallery slots synced into product_galleries
+IMAGE_FIELDS = ["image_1920"] + ["image_%d" % i for i in range(1, 11)]
+
 
 class ProductHelper:
 
@@ -58,6 +61,46 @@ class ProductHelper:
             print(f"Error getting tax info for product {product_template_id}: {str(e)}")
             return {"has_tax": False, "tax_rate": 0, "tax_amount": 0}
 
+    def get_image_fingerprints(self, product_template_ids):
+        """Cheap per-field image fingerprints for templates, without downloading any image data.
+
+        Reads the checksum of each image attachment; if ir.attachment is not readable, falls back
+        to one presence search per image field.
+        """
+        fingerprints = {template_id: {} for template_id in product_template_ids}
+        if not product_template_ids:
+            return fingerprints
+
+        try:
+            attachments = self.connector.search_read(
+                "ir.attachment",
+                [
+                    ("res_model", "=", "product.template"),
+                    ("res_id", "in", list(product_template_ids)),
+                    ("res_field", "in", IMAGE_FIELDS),
+                ],
+                ["res_id", "res_field", "checksum"],
+            )
+            for attachment in attachments:
+                if attachment["res_id"] in fingerprints:
+                    fingerprints[attachment["res_id"]][attachment["res_field"]] = attachment["checksum"]
+            return fingerprints
+        except Exception as e:
+            print(f"⚠️  Attachment checksums unavailable, using image presence: {str(e)}")
+
+        for field in IMAGE_FIELDS:
+            try:
+                with_image = self.connector.search(
+                    "product.template",
+                    [("id", "in", list(product_template_ids)), (field, "!=", False)],
+                )
+            except Exception as e:
+                print(f"⚠️  Presence check failed for {field}: {str(e)}")
+                continue
+            for template_id in with_image:
+                fingerprints[template_id][field] = True
+        return fingerprints
+
     def get_odoo_image_url(self, product_id, image_type='main'):
         """Generate Odoo public image URL - no downloading needed"""
         try:
@@ -75,15 +118,20 @@ class ProductHelper:
             print(f"❌ Failed to generate image URL for product {product_id}: {str(e)}")
             return "no_product_image.jpg"
 
-    def sync_product_gallery(self, product_template_id, laravel_product_id):
-        """Sync product gallery URLs from Odoo to Laravel product_galleries table"""
+    def sync_product_gallery(self, product_template_id, laravel_product_id, strict=False):
+        """Sync product gallery URLs from Odoo to Laravel product_galleries table.
+
+        With strict=True, images that could not be checked or stored raise instead of being skipped.
+        """
+        failed = 0
         try:
             print(f"🖼️  Syncing gallery for product {product_template_id}")
             
             # Clear existing gallery for this product (from sync)
             self.sql_connector.delete(
                 "product_galleries", 
-                f"`product_id` = '{laravel_product_id}' AND (`image` LIKE 'https://odoo.eboutiques.com/%' OR `image` LIKE 'storage/products/%')"
+                "`product_id` = %s AND (`image` LIKE %s OR `image` LIKE %s)",
+                [laravel_product_id, "https://odoo.eboutiques.com/%", "storage/products/%"]
             )
             
             synced_count = 0
@@ -118,25 +166,65 @@ class ProductHelper:
                             synced_count += 1
                             print(f"  ✅ Gallery image {i} added: {image_url}")
                         else:
+                            failed += 1
                             print(f"  ❌ Failed to insert gallery image {i}")
                     elif response.status_code == 404:
                         print(f"    ❌ Image {i} not found (404)")
                     else:
+                        failed += 1
                         print(f"    ⚠️  Image {i} returned status: {response.status_code}")
                     
                 except Exception as e:
+                    failed += 1
                     print(f"    ❌ Error checking image_{i}: {str(e)}")
                     pass
             
             print(f"🎉 Synced {synced_count} gallery images for product {product_template_id}")
+            if strict and failed:
+                raise RuntimeError(f"{failed} gallery images of product {product_template_id} could not be synced")
             return synced_count
             
         except Exception as e:
             print(f"❌ Gallery sync failed for product {product_template_id}: {str(e)}")
+            if strict:
+                raise
             return 0
 
-    def upsert_product_variant(self, v, attrs, product_id, tax_info, template_id=None):
-        """Updated variant upsert with tax information and template_id for images"""
+    def upsert_variant_rows(self, variant_rows):
+        """Upsert (variant data, update data) rows with one statement, row by row if that fails.
+
+        One bad row (too long, a constraint) rolls the whole statement back, the fallback keeps the
+        good rows. Returns ([{id, remote_key_id}], [(variant data, error)]).
+        """
+        try:
+            synced = self.sql_connector.upsert_many(
+                "product_variants",
+                [variant_data for variant_data, _ in variant_rows],
+                "remote_key_id",
+                update_columns=list(variant_rows[0][1]),
+            ).fetch() or []
+            return synced, []
+        except Exception as e:
+            if len(variant_rows) == 1:
+                return [], [(variant_rows[0][0], str(e))]
+            print(f"  ⚠️  Bulk variant upsert failed ({str(e)}), retrying {len(variant_rows)} rows one by one")
+
+        synced = []
+        failed = []
+        for variant_data, update_data in variant_rows:
+            try:
+                synced.extend(self.sql_connector.upsert_many(
+                    "product_variants",
+                    [variant_data],
+                    "remote_key_id",
+                    update_columns=list(update_data),
+                ).fetch() or [])
+            except Exception as e:
+                failed.append((variant_data, str(e)))
+        return synced, failed
+
+    def variant_row(self, v, attrs, product_id, tax_info, template_id=None):
+        """(insert data, update data) of a variant for product_variants, None without SKU"""
         if (
             v["default_code"] is False
             or v["default_code"] is None
@@ -239,26 +327,7 @@ class ProductHelper:
             "image": variant_image  # Add variant image URL
         }
 
-        try:
-            sqlProdVariant = (
-                self.sql_connector
-                .upsert(
-                    "product_variants",
-                    variant_data,
-                    updatedData=update_data,
-                    where_clause=" `remote_key_id` = '%s' " % str(v["id"]),
-                )
-                .fetch()
-            )
-            
-            if sqlProdVariant:
-                print(f"  ✅ Variant synced: {v['display_name']} (SKU: {v['default_code']})")
-            
-            return sqlProdVariant
-            
-        except Exception as e:
-            print(f"  ❌ Variant sync failed for {v.get('display_name', 'Unknown')}: {str(e)}")
-            return None
+        return variant_data, update_data
 
     def upsert_product_template(self, p, variants, attrs):
         """Updated product template upsert with tax information"""
@@ -352,20 +421,18 @@ class ProductHelper:
         }
 
         try:
-            sqlProd = (
-                self.sql_connector
-                .upsert(
-                    "products",
-                    product_data,
-                    updatedData=update_data,
-                    where_clause=" `remote_key_id` = '%s' " % str(p["id"]),
-                )
-                .fetch()
-            )
+            # One INSERT ... ON DUPLICATE KEY UPDATE instead of a lookup, a write and a read-back
+            sqlProd = self.sql_connector.upsert_many(
+                "products",
+                [product_data],
+                "remote_key_id",
+                update_columns=list(update_data),
+            ).fetch()
+            sqlProd = sqlProd[0] if sqlProd else None
 
             if sqlProd is None:
                 print("⚠️  Product sync returned None - checking existing record...")
-                existing = self.sql_connector.getOne("products", f"`remote_key_id` = '{p['id']}'").fetch()
+                existing = self.sql_connector.getOne("products", {"remote_key_id": str(p["id"])}).fetch()
                 if existing:
                     print(f"✅ Product exists with Laravel ID: {existing['id']}")
                     sqlProd = existing
@@ -386,6 +453,7 @@ class ProductHelper:
             
             print(f"🔧 Processing {len(variants)} variants...")
             
+            variant_rows = []
             for v in variants:
                 if v.get("default_code") and v["default_code"]:  # Only sync variants with SKU
                     related_attr = [
@@ -393,12 +461,20 @@ class ProductHelper:
                     ]
                     related_attr = list({a["id"]: a for a in related_attr}.values())
                     
-                    variant_result = self.upsert_product_variant(v, related_attr, product_laravel_id, tax_info, p['id'])
-                    if variant_result:
-                        synced_variants += 1
+                    row = self.variant_row(v, related_attr, product_laravel_id, tax_info, p['id'])
+                    if row:
+                        variant_rows.append(row)
                     else:
                         variant_errors += 1
 
+            # All variants of the template in one statement
+            if variant_rows:
+                synced, failed = self.upsert_variant_rows(variant_rows)
+                synced_variants = len(synced)
+                variant_errors += len(variant_rows) - synced_variants
+                for variant_data, error in failed:
+                    print(f"  ❌ Variant {variant_data.get('sku')} (remote {variant_data.get('remote_key_id')}) failed: {error}")
+
             print(f"✅ Synced {synced_variants} variants ({variant_errors} errors)")
 
             # Cleanup obsolete variants (simplified to avoid syntax issues)
@@ -406,10 +482,9 @@ class ProductHelper:
                 try:
                     current_skus = [v["default_code"] for v in variants if v.get("default_code")]
                     if current_skus:
-                        # Build a safe query to disable old variants
-                        sku_list = "', '".join(current_skus)
-                        cleanup_query = f"`product_id` = '{product_laravel_id}' AND `sku` NOT IN ('{sku_list}')"
-                        self.sql_connector.update("product_variants", cleanup_query, {"status": 0})
+                        # Disable variants whose SKU is no longer on the template
+                        cleanup_where = [("product_id", "=", product_laravel_id), ("sku", "not in", current_skus)]
+                        self.sql_connector.update("product_variants", cleanup_where, {"status": 0})
                         print("✅ Cleaned up obsolete variants")
                 except Exception as e:
                     print(f"⚠️  Variant cleanup warning: {str(e)}")
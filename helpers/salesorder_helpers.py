@@ -4,6 +4,7 @@ import json
 from numpy import number
 from helpers.helpers import slugify
 from helpers.odoo_connector import OdooConnector
+from helpers.odoo_loader import OdooReadLoader
 from helpers.sql_connector import SQLConnector
 from helpers.stock_helpers import StockPickingOrder
 from helpers.user_helpers import UsersHelper
@@ -45,6 +46,8 @@ class SalesOrderHelper:
 
         products = order_details.get("products")
         odooLines = []
+        pendingLines = []
+        loader = OdooReadLoader(self.connector)
 
         for product_line in products:
             if product_line.get("sku") is None:
@@ -64,12 +67,20 @@ class SalesOrderHelper:
             if len(product_id) <= 0:
                 raise Exception("Product %s not found" % product_line.get("sku"))
 
-            # check product availablity
-            [odooProduct] = self.connector.read(
-                "product.product",
+            # queue the availability read, all lines are fetched in one merged read below
+            pendingLines.append((
+                product_line,
                 product_id,
-                ["qty_available", "name", "uom_id", "display_name"],
-            )
+                loader.load(
+                    "product.product",
+                    product_id,
+                    ["qty_available", "name", "uom_id", "display_name"],
+                ),
+            ))
+
+        for product_line, product_id, pending in pendingLines:
+            # check product availablity
+            [odooProduct] = pending.result()
 
             #print("[sales_order] odooProduct : ", odooProduct)
 
@@ -1,55 +1,304 @@
+import datetime
+import functools
+import hashlib
 import json
 import pymysql.cursors
+from pymysql.constants import CLIENT
 import threading
 import time
 import random
 from contextlib import contextmanager
+from decimal import Decimal
 
 from helpers.helpers import print_html
+from helpers.sql_metrics import sql_metrics
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+def index_exists(table_name, columns, unique=False):
+    """Query returning a row when `table_name` already has an index on exactly `columns`, whatever its name"""
+    sql = (
+        "SELECT `index_name` FROM information_schema.statistics "
+        "WHERE `table_schema` = DATABASE() AND `table_name` = %s" + (" AND `non_unique` = 0" if unique else "") + " "
+        "GROUP BY `index_name` HAVING GROUP_CONCAT(`column_name` ORDER BY `seq_in_index`) = %s"
+    )
+    return sql, (table_name, ",".join(columns))
+
+
+# (version, sql[, skip_if]) entries, applied once each and recorded in the `sync_migrations` ledger.
+# `skip_if` is a (query, params) pair: when it returns a row the change is already in the schema and
+# the version is only recorded. Never edit or reorder an applied entry, append a new version instead.
 migrations = [
-    """ALTER TABLE `products` ADD `remote_key_id` VARCHAR(101) NULL DEFAULT NULL AFTER `uuid`; 
-    ALTER TABLE `products` ADD UNIQUE(`remote_key_id`);
-    """,
-    """
-    ALTER TABLE `product_variants` ADD `remote_key_id` VARCHAR(101) NULL DEFAULT NULL, ADD UNIQUE `remote_key_id` (`remote_key_id`); 
-    """,
-    """
-    ALTER TABLE `users` ADD `remote_key_id` VARCHAR(101) NULL DEFAULT NULL, ADD UNIQUE `remote_key_id` (`remote_key_id`); 
-    """,
-    """
-    ALTER TABLE `orders` ADD `remote_key_id` VARCHAR(101) NULL DEFAULT NULL, ADD UNIQUE `remote_key_id` (`remote_key_id`); 
-    """,
+    ("0001_products_remote_key_id", """
+    ALTER TABLE `products` ADD `remote_key_id` VARCHAR(101) NULL DEFAULT NULL AFTER `uuid`;
+    """),
+    # an unnamed ADD UNIQUE is not idempotent, MySQL adds remote_key_id_2 next to an existing key
+    ("0001_products_remote_key_id_unique", """
+    ALTER TABLE `products` ADD UNIQUE KEY `products_remote_key_id` (`remote_key_id`);
+    """, index_exists("products", ("remote_key_id",), unique=True)),
+    ("0002_product_variants_remote_key_id", """
+    ALTER TABLE `product_variants` ADD `remote_key_id` VARCHAR(101) NULL DEFAULT NULL, ADD UNIQUE `remote_key_id` (`remote_key_id`);
+    """),
+    ("0003_users_remote_key_id", """
+    ALTER TABLE `users` ADD `remote_key_id` VARCHAR(101) NULL DEFAULT NULL, ADD UNIQUE `remote_key_id` (`remote_key_id`);
+    """),
+    ("0004_orders_remote_key_id", """
+    ALTER TABLE `orders` ADD `remote_key_id` VARCHAR(101) NULL DEFAULT NULL, ADD UNIQUE `remote_key_id` (`remote_key_id`);
+    """),
     # NEW TAX FIELD MIGRATIONS
-    """
+    ("0005_products_tax_fields", """
     ALTER TABLE `products` ADD `price_without_tax` DECIMAL(10,2) DEFAULT 0 AFTER `price`,
     ADD `tax_rate` DECIMAL(5,2) DEFAULT 0 AFTER `price_without_tax`,
     ADD `tax_amount` DECIMAL(10,2) DEFAULT 0 AFTER `tax_rate`,
     ADD `tax_inclusive` BOOLEAN DEFAULT TRUE AFTER `tax_amount`;
-    """,
-    """
+    """),
+    ("0006_product_variants_tax_fields", """
     ALTER TABLE `product_variants` ADD `price_without_tax` DECIMAL(10,2) DEFAULT 0 AFTER `price`,
     ADD `cost_price` DECIMAL(10,2) DEFAULT 0 AFTER `price_without_tax`,
     ADD `tax_rate` DECIMAL(5,2) DEFAULT 0 AFTER `cost_price`,
     ADD `tax_amount` DECIMAL(10,2) DEFAULT 0 AFTER `tax_rate`,
     ADD `tax_inclusive` BOOLEAN DEFAULT TRUE AFTER `tax_amount`,
     ADD `percentage` DECIMAL(5,2) DEFAULT 0 AFTER `tax_inclusive`;
-    """,
-    """
+    """),
+    ("0007_orders_tax_fields", """
     ALTER TABLE `orders` ADD `tax_amount` DECIMAL(10,2) DEFAULT 0 AFTER `coupon_coast`,
     ADD `tax_details` JSON NULL AFTER `tax_amount`,
     ADD `odoo_order_id` VARCHAR(255) NULL DEFAULT NULL AFTER `remote_key_id`,
     ADD `stock_status` VARCHAR(100) NULL DEFAULT NULL AFTER `odoo_order_id`;
-    """,
+    """),
+    # indexes behind the per-product variant/gallery lookups of every sync cycle
+    ("0008_product_variants_product_id_sku_index", """
+    ALTER TABLE `product_variants` ADD INDEX `product_variants_product_id_sku` (`product_id`, `sku`), ALGORITHM=INPLACE, LOCK=NONE;
+    """, index_exists("product_variants", ("product_id", "sku"))),
+    ("0009_product_galleries_product_id_index", """
+    ALTER TABLE `product_galleries` ADD INDEX `product_galleries_product_id` (`product_id`), ALGORITHM=INPLACE, LOCK=NONE;
+    """, index_exists("product_galleries", ("product_id",))),
 ]
 
+MIGRATION_LEDGER = "sync_migrations"
+MIGRATION_LOCK = "python_runner_migrations"
+
+# duplicate column / key name: the change is already in the schema (applied before the ledger existed)
+ALREADY_APPLIED_ERRORS = (1060, 1061)
+
+# a failed version waits this long before the next attempt, doubling per failure up to the max
+MIGRATION_RETRY_SECONDS = float(os.getenv("DB_MIGRATION_RETRY_SECONDS", "300"))
+MIGRATION_RETRY_MAX_SECONDS = float(os.getenv("DB_MIGRATION_RETRY_MAX_SECONDS", "21600"))
+
+# version: (failures, monotonic time of the next attempt), for the life of the process
+failed_migrations = {}
+failed_migrations_lock = threading.Lock()
+
+
+class MigrationError(Exception):
+    """Some migrations failed or are backing off after a failure, they stay pending"""
+
+    def __init__(self, versions):
+        self.versions = versions
+        super().__init__("[migration] pending after failure: " + ", ".join(versions))
+
+
+def migration_statements(sql):
+    return [statement.strip() for statement in sql.split(";") if statement.strip()]
+
+
+def migration_checksum(sql):
+    return hashlib.sha1(" ".join(sql.split()).encode("utf-8")).hexdigest()
+
+
+STRINGIFIED_TYPES = frozenset((Decimal, datetime.datetime, datetime.date, datetime.time, datetime.timedelta))
+
+
+def json_safe(value):
+    """The string the old JSON round trip turned DECIMAL/DATETIME/TIME values into"""
+    return str(value) if type(value) in STRINGIFIED_TYPES else value
+
+
+def coerce_row(row, coerce):
+    if callable(coerce):
+        return {key: coerce(value) for key, value in row.items()}
+    row = dict(row)
+    for column, convert in coerce.items():
+        if row.get(column) is not None:
+            row[column] = convert(row[column])
+    return row
+
+
+WHERE_OPERATORS = ("=", "!=", "<>", "<", "<=", ">", ">=", "in", "not in", "like", "not like")
+
+
+def quote_name(name):
+    return "`%s`" % str(name).replace("`", "``")
+
+
+def parse_where(where):
+    """Structured where -> (shape, params).
+
+    `where` is a dict of column equalities (a list or tuple value means IN) or a list of
+    (column, operator, value) triples, AND-ed together like an Odoo domain. The shape only depends
+    on the columns, operators and IN list sizes, so every row of a loop compiles to the same
+    statement text.
+    """
+    if isinstance(where, dict):
+        conditions = [(column, "in" if isinstance(value, (list, tuple)) else "=", value) for column, value in where.items()]
+    else:
+        conditions = where
+    shape = []
+    params = []
+    for column, operator, value in conditions:
+        operator = operator.lower()
+        if operator not in WHERE_OPERATORS:
+            raise ValueError("Unsupported where operator %s" % operator)
+        if operator not in ("in", "not in") and isinstance(value, (list, tuple, set)):
+            raise ValueError("Operator %s on %s needs a single value, use in / not in for lists" % (operator, column))
+        if operator in ("in", "not in"):
+            value = list(value)
+            shape.append((column, operator, len(value)))
+            params.extend(value)
+        elif value is None:
+            # = None / != None mean IS NULL / IS NOT NULL like in Odoo domains
+            shape.append((column, operator, None))
+        else:
+            shape.append((column, operator, 1))
+            params.append(value)
+    return tuple(shape), params
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_where(shape):
+    parts = []
+    for column, operator, size in shape:
+        name = quote_name(column)
+        if size is None:
+            parts.append("%s IS %sNULL" % (name, "" if operator == "=" else "NOT "))
+        elif operator in ("in", "not in"):
+            if size == 0:
+                parts.append("1=0" if operator == "in" else "1=1")
+            else:
+                parts.append("%s %s (%s)" % (name, operator.upper(), ", ".join(["%s"] * size)))
+        else:
+            parts.append("%s %s %%s" % (name, operator.upper()))
+    return " AND ".join(parts) or "1=1"
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_select(table_name, select, where_shape, limit=None):
+    if isinstance(select, tuple):
+        select = ", ".join(quote_name(column) for column in select)
+    sql = "SELECT %s FROM %s WHERE %s" % (select, quote_name(table_name), compile_where(where_shape))
+    return sql + (" LIMIT %d" % limit if limit else "")
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_update(table_name, columns, where_shape):
+    assignments = ", ".join("%s = %%s" % quote_name(column) for column in columns)
+    # updated_at is set on every write like Laravel does
+    return "UPDATE %s SET %s, `updated_at` = NOW() WHERE %s" % (quote_name(table_name), assignments, compile_where(where_shape))
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_insert(table_name, columns):
+    names = ", ".join(quote_name(column) for column in columns)
+    values = ", ".join(["%s"] * len(columns))
+    return "INSERT INTO %s (%s, `updated_at`, `created_at`) VALUES (%s, NOW(), NOW())" % (quote_name(table_name), names, values)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_delete(table_name, where_shape):
+    return "DELETE FROM %s WHERE %s" % (quote_name(table_name), compile_where(where_shape))
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_upsert(table_name, columns, update_columns, row_count):
+    names = ", ".join(quote_name(column) for column in columns)
+    row = "(%s, NOW(), NOW())" % ", ".join(["%s"] * len(columns))
+    # VALUES() rather than the 8.0.19 row alias so MariaDB accepts it too
+    updates = "".join("%s = VALUES(%s), " % (quote_name(column), quote_name(column)) for column in update_columns)
+    return "INSERT INTO %s (%s, `updated_at`, `created_at`) VALUES %s ON DUPLICATE KEY UPDATE %s`updated_at` = NOW()" % (
+        quote_name(table_name), names, ", ".join([row] * row_count), updates
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def compile_key_lookup(table_name, keys, column, count):
+    if len(keys) == 1:
+        condition = "%s IN (%s)" % (quote_name(keys[0]), ", ".join(["%s"] * count))
+    else:
+        row = "(%s)" % ", ".join(["%s"] * len(keys))
+        condition = "(%s) IN (%s)" % (", ".join(quote_name(key) for key in keys), ", ".join([row] * count))
+    selected = ", ".join(quote_name(name) for name in dict.fromkeys(("id",) + keys + (column,)))
+    return "SELECT %s FROM %s WHERE %s FOR UPDATE" % (selected, quote_name(table_name), condition)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_case_update(table_name, column, count):
+    cases = " ".join(["WHEN %s THEN %s"] * count)
+    ids = ", ".join(["%s"] * count)
+    return "UPDATE %s SET %s = CASE `id` %s END, `updated_at` = NOW() WHERE `id` IN (%s)" % (
+        quote_name(table_name), quote_name(column), cases, ids
+    )
+
+
+def statement_cache_info():
+    return {
+        fn.__name__: fn.cache_info()._asdict()
+        for fn in (compile_where, compile_select, compile_update, compile_insert, compile_delete, compile_upsert, compile_key_lookup, compile_case_update)
+    }
+
+
+class TimedCursorMixin:
+    """Reports every statement to sql_metrics with its run time, rows and the pool wait before it"""
+
+    def execute(self, query, args=None):
+        # the checkout wait is charged to the first statement run on the connection
+        wait = getattr(self.connection, "checkout_wait", 0.0)
+        if wait:
+            self.connection.checkout_wait = 0.0
+        self.statement = query
+        started = time.perf_counter()
+        try:
+            result = super().execute(query, args)
+        except Exception as e:
+            sql_metrics.record(query, time.perf_counter() - started, wait_seconds=wait, error=e)
+            raise
+        sql_metrics.record(query, time.perf_counter() - started, rows=self.reported_rows(), wait_seconds=wait)
+        return result
+
+    def reported_rows(self):
+        return max(self.rowcount or 0, 0)
+
+
+class TimedDictCursor(TimedCursorMixin, pymysql.cursors.DictCursor):
+    pass
+
+
+class TimedSSDictCursor(TimedCursorMixin, pymysql.cursors.SSDictCursor):
+    """Execute time is the time to the first row; rows are counted as they are fetched"""
+
+    def reported_rows(self):
+        return 0
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(size)
+        if rows:
+            sql_metrics.add_rows(self.statement, len(rows))
+        return rows
+
+
+class PoolTimeout(Exception):
+    """No database connection was released within the checkout timeout"""
+
 
 class ConnectionPool:
+    """Bounded MySQL connection pool shared by every SQLConnector in the process.
+
+    Keeps up to `pool_size` idle connections and opens at most `max_overflow` more under load;
+    past that, checkouts wait up to `timeout` seconds. Connections older than `max_lifetime` are
+    recycled and ones idle for more than `ping_after` seconds are pinged before reuse.
+    """
     _instance = None
     _lock = threading.Lock()
     
@@ -62,31 +311,145 @@ class ConnectionPool:
     
     def __init__(self):
         if not hasattr(self, 'initialized'):
-            self.pool = []
-            self.pool_size = 2  # Reduced to avoid overwhelming the DB
+            self.pool = []  # idle (connection, last_used) pairs, most recent last
+            self.pool_size = int(os.getenv("DB_POOL_SIZE", "2"))  # Small by default to avoid overwhelming the DB
+            self.max_overflow = int(os.getenv("DB_POOL_MAX_OVERFLOW", "2"))
+            self.timeout = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+            self.max_lifetime = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+            self.ping_after = float(os.getenv("DB_POOL_PING_AFTER", "30"))
             self.current_size = 0
+            self.created_at = {}
             self.lock = threading.Lock()
+            self.condition = threading.Condition(self.lock)
+            self.counters = {
+                "checkouts": 0,
+                "waits": 0,
+                "wait_seconds": 0.0,
+                "max_wait_seconds": 0.0,
+                "timeouts": 0,
+                "opened": 0,
+                "recycled": 0,
+                "ping_failures": 0,
+                "discarded": 0,
+            }
             self.initialized = True
-    
-    def get_connection(self):
-        with self.lock:
-            if self.pool:
-                return self.pool.pop()
-            elif self.current_size < self.pool_size:
-                self.current_size += 1
-                return self._create_connection()
-            else:
-                # If pool is full, create a temporary connection
-                return self._create_connection()
-    
-    def return_connection(self, conn):
-        if conn and conn.open:
-            with self.lock:
-                if len(self.pool) < self.pool_size:
-                    self.pool.append(conn)
+
+    @property
+    def max_size(self):
+        return self.pool_size + self.max_overflow
+
+    def get_connection(self, timeout=None):
+        started = time.monotonic()
+        deadline = started + (self.timeout if timeout is None else timeout)
+        waited = False
+        while True:
+            conn = None
+            with self.condition:
+                while not self.pool and self.current_size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters["timeouts"] += 1
+                        raise PoolTimeout("No database connection free within %.1fs (%d in use)" % (time.monotonic() - started, self.current_size))
+                    waited = True
+                    self.condition.wait(remaining)
+                if self.pool:
+                    conn, last_used = self.pool.pop()
                 else:
-                    conn.close()
-                    self.current_size -= 1
+                    # reserve the slot before connecting so concurrent checkouts cannot overshoot
+                    self.current_size += 1
+
+            if conn is None:
+                try:
+                    conn = self._create_connection()
+                except Exception:
+                    self._release_slot()
+                    raise
+                with self.lock:
+                    self.created_at[conn] = time.monotonic()
+                    self.counters["opened"] += 1
+            elif time.monotonic() - self.created_at.get(conn, 0) > self.max_lifetime:
+                with self.lock:
+                    self.counters["recycled"] += 1
+                self.discard_connection(conn, count=False)
+                continue
+            elif time.monotonic() - last_used > self.ping_after and not self._ping(conn):
+                with self.lock:
+                    self.counters["ping_failures"] += 1
+                self.discard_connection(conn, count=False)
+                continue
+
+            wait = time.monotonic() - started
+            conn.checkout_wait = wait
+            with self.lock:
+                self.counters["checkouts"] += 1
+                if waited:
+                    self.counters["waits"] += 1
+                    self.counters["wait_seconds"] += wait
+                    self.counters["max_wait_seconds"] = max(self.counters["max_wait_seconds"], wait)
+            return conn
+
+    def _ping(self, conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def return_connection(self, conn):
+        if conn is None:
+            return
+        expired = time.monotonic() - self.created_at.get(conn, 0) > self.max_lifetime
+        with self.condition:
+            # overflow connections are closed once the idle pool is full again
+            if conn.open and not expired and len(self.pool) < self.pool_size:
+                self.pool.append((conn, time.monotonic()))
+                self.condition.notify()
+                return
+        self.discard_connection(conn, count=False)
+
+    def discard_connection(self, conn, count=True):
+        """Close a checked out connection that is broken or in an unknown state"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.created_at.pop(conn, None)
+            if count:
+                self.counters["discarded"] += 1
+            self.current_size -= 1
+            self.condition.notify()
+
+    def _release_slot(self):
+        with self.condition:
+            self.current_size -= 1
+            self.condition.notify()
+
+    def prewarm(self, count=None):
+        """Open connections ahead of the first sync cycle, up to pool_size by default"""
+        count = min(self.pool_size if count is None else count, self.pool_size)
+        conns = []
+        try:
+            while len(conns) + len(self.pool) < count:
+                conns.append(self.get_connection())
+        finally:
+            for conn in conns:
+                self.return_connection(conn)
+        return self
+
+    def stats(self):
+        with self.lock:
+            in_use = self.current_size - len(self.pool)
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "open": self.current_size,
+                "idle": len(self.pool),
+                "in_use": in_use,
+                "utilization": round(in_use / self.max_size, 3) if self.max_size else 0,
+                "avg_wait_seconds": round(self.counters["wait_seconds"] / self.counters["waits"], 6) if self.counters["waits"] else 0.0,
+                **self.counters,
+            }
     
     def _create_connection(self, retries=3):
         for attempt in range(retries):
@@ -97,7 +460,9 @@ class ConnectionPool:
                     port=int(os.getenv("DB_PORT")),
                     password=os.getenv("DB_PASSWORD"),
                     database=os.getenv("DB_NAME"),
-                    cursorclass=pymysql.cursors.DictCursor,
+                    cursorclass=TimedDictCursor,
+                    # UPDATE rowcount counts matched rows, not only the ones whose values changed
+                    client_flag=CLIENT.FOUND_ROWS,
                     connect_timeout=10,
                     read_timeout=30,
                     write_timeout=30,
@@ -112,158 +477,539 @@ class ConnectionPool:
     
     def close_all(self):
         with self.lock:
-            for conn in self.pool:
+            for conn, _ in self.pool:
                 try:
                     conn.close()
                 except:
                     pass
+                self.created_at.pop(conn, None)
+            # checked out connections stay counted until they come back and get closed
+            self.current_size -= len(self.pool)
             self.pool.clear()
-            self.current_size = 0
+
+class SQLResult:
+    """What one SQLConnector call returned, read with fetch() or toJSON()"""
+
+    def __init__(self, results=None):
+        self._results = results
+
+    def toJSON(self):
+        if (
+            self._results is None
+            or (not isinstance(self._results, int) and len(self._results) == 0)
+            or self._results is False
+            or self._results == "null"
+        ):
+            return None
+        return json.dumps(self._results, default=str)
+
+    def fetch(self, coerce=None):
+        """Rows as the driver returned them (a list of dicts, one dict for getOne), None when empty.
+
+        `coerce` converts values on the way out: one callable for every value (json_safe gives the
+        strings older callers got), or a {column: callable} dict such as {"qty": int}.
+        """
+        results = self._results
+        if results is None or results is False or (not isinstance(results, int) and len(results) == 0):
+            return None
+        if isinstance(results, tuple):
+            results = list(results)
+        if coerce is None or isinstance(results, int):
+            return results
+        if isinstance(results, dict):
+            return coerce_row(results, coerce)
+        return [coerce_row(row, coerce) for row in results]
+
+    def toHTML(self):
+        return print_html(self.toJSON())
+
 
 class SQLConnector:
-    _results = None
-    _debug = False
+    """Stateless facade over the shared pool: every call checks out its own connection and
+    returns its own SQLResult, so one instance can serve any number of threads"""
     _pool = ConnectionPool()
 
     def __init__(self, debug=False) -> None:
         self._debug = debug
-        self.connection = None
 
     @contextmanager
     def get_connection(self):
         conn = self._pool.get_connection()
         try:
-            self.connection = conn
             yield conn
-        finally:
+        except BaseException as e:
+            # a failed statement only needs a rollback, an abandoned stream or broken link is dropped
+            reusable = False
+            if not isinstance(e, GeneratorExit):
+                try:
+                    conn.rollback()
+                    reusable = conn.open
+                except Exception:
+                    pass
+            if reusable:
+                self._pool.return_connection(conn)
+            else:
+                self._pool.discard_connection(conn)
+            raise
+        else:
             self._pool.return_connection(conn)
-            self.connection = None
 
-    def onDebug(self, msg):
+    def prewarm(self, count=None):
+        self._pool.prewarm(count)
+        return self
+
+    def pool_stats(self):
+        return self._pool.stats()
+
+    def onDebug(self, msg, results=None):
         if self._debug:
             print("[db.debug] ", msg)
-            print("[db.debug._results] ", json.dumps(self._results, default=str))
+            if results is not None:
+                print("[db.debug._results] ", json.dumps(results, default=str))
         return self
 
-    def migrate(self):
+    def migrate(self, lock_timeout=60, retry_failed=False):
+        """Apply the migrations missing from the ledger, a no-op round trip once the schema is current.
+
+        A version that fails is left out of the ledger and not attempted again in this process until
+        its backoff expires, unless `retry_failed` is set; the others still run. Raises MigrationError
+        naming every version that failed or is still backing off.
+        """
+        started = time.perf_counter()
+        failed = []
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                print ("[migration] started")
-                for migration in migrations:
-                    try:
-                        cursor.execute(migration)
-                        conn.commit()
-                    except Exception as e:
-                        # rollback
-                        self.onDebug("[migration] rollback" + str(e))
-                        conn.rollback()
-                    pass
+                cursor.execute(
+                    "CREATE TABLE IF NOT EXISTS " + quote_name(MIGRATION_LEDGER) + " ("
+                    "`version` VARCHAR(191) NOT NULL PRIMARY KEY, "
+                    "`checksum` CHAR(40) NOT NULL, "
+                    "`duration_ms` INT NOT NULL DEFAULT 0, "
+                    "`applied_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+                )
+                cursor.execute("SELECT `version`, `checksum` FROM " + quote_name(MIGRATION_LEDGER))
+                applied = {row["version"]: row["checksum"] for row in cursor.fetchall()}
+                conn.commit()
+
+                for version, sql, *_ in migrations:
+                    if version in applied and applied[version] != migration_checksum(sql):
+                        print(f"⚠️ [migration] {version} changed since it was applied, add a new version instead")
+                pending = [migration for migration in migrations if migration[0] not in applied]
+                if not pending:
+                    self.onDebug("[migration] schema up to date (%d applied)" % len(applied))
+                    return self
+
+                waiting = [] if retry_failed else self._backing_off([migration[0] for migration in pending])
+                pending = [migration for migration in pending if migration[0] not in waiting]
+                if not pending:
+                    raise MigrationError(waiting)
+
+                # several workers start together, only one of them migrates
+                cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (MIGRATION_LOCK, lock_timeout))
+                if not cursor.fetchone()["locked"]:
+                    raise RuntimeError("[migration] could not take the migration lock within %ss" % lock_timeout)
+                try:
+                    cursor.execute("SELECT `version` FROM " + quote_name(MIGRATION_LEDGER))
+                    applied = {row["version"] for row in cursor.fetchall()}
+                    conn.commit()
+                    pending = [migration for migration in pending if migration[0] not in applied]
+                    print(f"[migration] {len(pending)} pending")
+                    for version, sql, *skip_if in pending:
+                        try:
+                            self._apply_migration(conn, cursor, version, sql, skip_if[0] if skip_if else None)
+                        except pymysql.err.MySQLError:
+                            # a lost connection fails again on RELEASE_LOCK and propagates; a later version
+                            # that depends on this one fails on its own and backs off the same way
+                            self._migration_failed(version)
+                            failed.append(version)
+                            continue
+                        with failed_migrations_lock:
+                            failed_migrations.pop(version, None)
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+                    cursor.fetchall()
+        print(f"[migration] done in {(time.perf_counter() - started) * 1000:.0f} ms")
+        if failed or waiting:
+            raise MigrationError(failed + waiting)
         return self
+
+    def _backing_off(self, versions):
+        now = time.monotonic()
+        with failed_migrations_lock:
+            waiting = [version for version in versions if version in failed_migrations and failed_migrations[version][1] > now]
+            for version in waiting:
+                failures, retry_at = failed_migrations[version]
+                print(f"⏸️ [migration] {version} failed {failures}x, next attempt in {retry_at - now:.0f}s")
+        return waiting
+
+    def _migration_failed(self, version):
+        with failed_migrations_lock:
+            failures = failed_migrations.get(version, (0, 0))[0] + 1
+            delay = min(MIGRATION_RETRY_SECONDS * 2 ** (failures - 1), MIGRATION_RETRY_MAX_SECONDS)
+            failed_migrations[version] = (failures, time.monotonic() + delay)
+        print(f"⚠️ [migration] {version} stays pending, next attempt in {delay:.0f}s")
+
+    def _apply_migration(self, conn, cursor, version, sql, skip_if=None):
+        started = time.perf_counter()
+        statements = migration_statements(sql)
+        if skip_if is not None:
+            cursor.execute(*skip_if)
+            if cursor.fetchall():
+                print(f"[migration] {version}: already in schema")
+                statements = []
+        for statement in statements:
+            self.onDebug(statement)
+            try:
+                cursor.execute(statement)
+            except pymysql.err.MySQLError as e:
+                if e.args and e.args[0] in ALREADY_APPLIED_ERRORS:
+                    print(f"[migration] {version}: already in schema ({e.args[1] if len(e.args) > 1 else e})")
+                    continue
+                conn.rollback()
+                # left out of the ledger, so the next start retries it
+                print(f"❌ [migration] {version} failed: {e}")
+                raise
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        cursor.execute(
+            "INSERT INTO " + quote_name(MIGRATION_LEDGER) + " (`version`, `checksum`, `duration_ms`) VALUES (%s, %s, %s)",
+            (version, migration_checksum(sql), duration_ms),
+        )
+        conn.commit()
+        print(f"✅ [migration] {version} applied in {duration_ms} ms")
        
 
+    def update_sql(self, table_name, where_clause, data, fields=None):
+        columns = tuple(data.keys())
+        if isinstance(where_clause, (dict, list, tuple)):
+            shape, where_params = parse_where(where_clause)
+            return compile_update(table_name, columns, shape), list(data.values()) + where_params
+        if fields is None:
+            # the raw clause is formatted by the driver together with the SET params
+            where_clause = where_clause.replace("%", "%%")
+        sql = "UPDATE %s SET %s, `updated_at` = NOW() WHERE %s" % (
+            quote_name(table_name),
+            ", ".join("%s = %%s" % quote_name(column) for column in columns),
+            where_clause,
+        )
+        return sql, list(data.values()) + list(fields or [])
+
+    def insert_sql(self, table_name, data):
+        return compile_insert(table_name, tuple(data.keys())), list(data.values())
+
+    def delete_sql(self, table_name, where_clause, fields=None):
+        if isinstance(where_clause, (dict, list, tuple)):
+            shape, params = parse_where(where_clause)
+            return compile_delete(table_name, shape), params
+        return f"DELETE FROM {table_name} WHERE {where_clause}", fields
+
+    def select_sql(self, table_name, where_clause, fields, select, limit=None):
+        select = tuple(select) if isinstance(select, (list, tuple)) else select
+        if isinstance(where_clause, (dict, list, tuple)):
+            shape, params = parse_where(where_clause)
+            return compile_select(table_name, select, shape, limit), params
+        if isinstance(select, tuple):
+            select = ", ".join(quote_name(column) for column in select)
+        if where_clause is None:
+            return f"SELECT {select} FROM {table_name}", None
+        return f"SELECT {select} FROM {table_name} WHERE {where_clause}", fields
+
     def getAll(self, table_name, where_clause=None, fields=None, select="*"):
+        sql, params = self.select_sql(table_name, where_clause, fields, select)
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                if where_clause is None:
-                    sql = f"SELECT {select} FROM {table_name}"
-                    cursor.execute(sql)
-                    result = cursor.fetchall()
-                    self._results = result
-                    return self
-                sql = f"SELECT {select}  FROM {table_name} WHERE {where_clause}"
-                cursor.execute(sql, fields)
-                result = cursor.fetchall()
-                self._results = result
-                return self
+                cursor.execute(sql, params)
+                return SQLResult(cursor.fetchall())
 
     def getOne(self, table_name, where_clause=None, fields=None, select="*"):
+        sql, params = self.select_sql(table_name, where_clause, fields, select, limit=1)
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                if where_clause is None:
-                    sql = f"SELECT {select} FROM {table_name}"
-                    cursor.execute(sql)
-                    result = cursor.fetchone()
-                    self._results = result
-                    return self
-                sql = f"SELECT {select} FROM {table_name} WHERE {where_clause}"
-                cursor.execute(sql, fields)
-                result = cursor.fetchone()
-                self._results = result
-                return self
+                cursor.execute(sql, params)
+                return SQLResult(cursor.fetchone())
+
+    def stream(self, table_name, columns, where_clause=None, fields=None, chunk_size=None, fetch_size=1000, write_timeout=None):
+        """Yield the rows of a scan while the server sends them, in bounded memory.
+
+        Runs on an unbuffered server-side cursor that holds one connection until the generator is
+        exhausted or closed. Only `columns` are selected; with chunk_size the generator yields lists
+        of up to that many rows instead of single rows. The server drops a stream that is not read
+        for net_write_timeout seconds, so the session raises it to `write_timeout`
+        (DB_STREAM_WRITE_TIMEOUT) for the length of the scan; it must cover the slowest work done
+        between two chunks.
+        """
+        sql, params = self.select_sql(table_name, where_clause, fields, list(columns))
+        write_timeout = int(write_timeout or os.getenv("DB_STREAM_WRITE_TIMEOUT", "900"))
+        with self.get_connection() as conn:
+            with conn.cursor() as session:
+                session.execute("SET SESSION net_write_timeout = %s", (write_timeout,))
+            # no `with` on the cursor: closing it would read off the rest of an abandoned scan,
+            # get_connection drops the connection instead
+            cursor = conn.cursor(TimedSSDictCursor)
+            self.onDebug("[sql.stream] %s" % sql)
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size or fetch_size)
+                if not rows:
+                    break
+                if chunk_size:
+                    yield rows
+                else:
+                    yield from rows
+            cursor.close()
+            # the connection goes back to the pool, later checkouts get the server default again
+            with conn.cursor() as session:
+                session.execute("SET SESSION net_write_timeout = DEFAULT")
 
-    def sanatize(self, data):
-        return {key: value.replace("'", '"') if isinstance(value, str) else value for key, value in data.items()}
 
+    def read_back(self, cursor, table_name, where_clause, fields=None, select="*"):
+        # reuse the writer's connection instead of checking out another one
+        sql, params = self.select_sql(table_name, where_clause, fields, "*" if select is True else select, limit=1)
+        cursor.execute(sql, params)
+        return cursor.fetchone()
 
-    def update(self, table_name, where_clause, data):
-        data = self.sanatize(data)
+    def update(self, table_name, where_clause, data, fields=None, read_back=False):
+        """Results are the number of matched rows, or the first matched row when read_back is
+        True (or a list of columns to select)"""
+        sql, params = self.update_sql(table_name, where_clause, data, fields)
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                fields = ", ".join([f"{key} = '{value}'" for key, value in data.items()])
-                # add updated at now to fields
-                fields = fields + ", updated_at = NOW()"
-                sql = f"UPDATE {table_name} SET {fields} WHERE {where_clause}"
-                self.onDebug("[sql.update] %s" % sql)
-                cursor.execute(sql)
+                self.onDebug("[sql.update] %s %s" % (sql, params))
+                cursor.execute(sql, params)
                 conn.commit()
-                self.getOne(table_name, where_clause)
-                return self
+                if read_back:
+                    return SQLResult(self.read_back(cursor, table_name, where_clause, fields, read_back))
+                return SQLResult(cursor.rowcount)
 
-    def insert(self, table_name, data, where_clause=None):
-        data = self.sanatize(data)
+    def insert(self, table_name, data, where_clause=None, read_back=False):
+        """Results are {"id": <auto increment id>}, or the row matching where_clause (or read_back
+        columns of the new row) when either is given"""
+        sql, params = self.insert_sql(table_name, data)
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                fields = ", ".join(data.keys())
-                values = ", ".join([f"'{value}'" for value in data.values()])
-
-                # add created at and updated at
-                fields += ", updated_at, created_at"
-                values += ", NOW(), NOW()"
-
-                sql = f"INSERT INTO {table_name} ({fields}) VALUES ({values})"
-                cursor.execute(sql)
-                self.onDebug("[sql.update] %s" % sql)
+                cursor.execute(sql, params)
+                self.onDebug("[sql.insert] %s" % sql)
                 conn.commit()
                 if where_clause is not None:
-                    self.getOne(table_name, where_clause)
-                return self
+                    return SQLResult(self.read_back(cursor, table_name, where_clause, select=read_back or "*"))
+                if read_back:
+                    return SQLResult(self.read_back(cursor, table_name, {"id": cursor.lastrowid}, select=read_back))
+                return SQLResult({"id": cursor.lastrowid})
 
-    def delete(self, table_name, where_clause):
+    def delete(self, table_name, where_clause, fields=None):
         """Delete records from table based on where clause"""
+        sql, params = self.delete_sql(table_name, where_clause, fields)
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                sql = f"DELETE FROM {table_name} WHERE {where_clause}"
                 self.onDebug("[sql.delete] %s" % sql)
-                cursor.execute(sql)
+                cursor.execute(sql, params)
                 conn.commit()
-                self._results = cursor.rowcount
-                return self
+                return SQLResult(cursor.rowcount)
+
+    def apply_quantities(self, table_name, column, quantities, key="id", chunk_size=1000):
+        """Set `column` from {key: value} pairs with a few set-based statements.
+
+        `key` is a column or a tuple of columns (then the pair keys are tuples too). Each chunk
+        locks and reads the matching rows, then writes only the rows whose value differs with one
+        UPDATE ... CASE on the primary key; everything commits in one transaction. Results are
+        {"changed": [{"id", "key", "old", "new"}], "unchanged": [keys], "missing": [keys]}.
+        """
+        keys = (key,) if isinstance(key, str) else tuple(key)
+        items = list(quantities.items()) if isinstance(quantities, dict) else list(quantities)
+
+        def normalize(value):
+            # VARCHAR keys such as remote_key_id come back as strings whatever the caller passed, and
+            # the default collations match them ignoring case and trailing spaces
+            return tuple(str(v).rstrip().lower() for v in (value if isinstance(value, tuple) else (value,)))
+
+        changed = []
+        unchanged = []
+        missing = []
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                for i in range(0, len(items), chunk_size):
+                    wanted = {normalize(k): (k, v) for k, v in items[i:i + chunk_size]}
+                    params = [part for k, _ in wanted.values() for part in (k if isinstance(k, tuple) else (k,))]
+                    cursor.execute(compile_key_lookup(table_name, keys, column, len(wanted)), params)
+
+                    found = set()
+                    updates = []
+                    for row in cursor.fetchall():
+                        row_key = normalize(tuple(row[name] for name in keys))
+                        if row_key not in wanted:
+                            # matched by a collation rule normalize() does not know, left to `missing`
+                            continue
+                        original_key, value = wanted[row_key]
+                        found.add(row_key)
+                        if row[column] is not None and row[column] == value:
+                            unchanged.append(original_key)
+                            continue
+                        updates.append((row["id"], value))
+                        changed.append({"id": row["id"], "key": original_key, "old": row[column], "new": value})
+                    missing.extend(k for normalized, (k, _) in wanted.items() if normalized not in found)
+
+                    if updates:
+                        params = [part for update in updates for part in update] + [row_id for row_id, _ in updates]
+                        cursor.execute(compile_case_update(table_name, column, len(updates)), params)
+                conn.commit()
+        self.onDebug("[sql.apply_quantities] %s: %d changed, %d unchanged, %d missing" % (table_name, len(changed), len(unchanged), len(missing)))
+        return SQLResult({"changed": changed, "unchanged": unchanged, "missing": missing})
+
+    def buffer(self, max_rows=500, max_age=5.0, on_failure=None):
+        """Write-behind unit of work, see WriteBuffer"""
+        return WriteBuffer(self, max_rows=max_rows, max_age=max_age, on_failure=on_failure)
 
     def upsert(self, table_name, data, updatedData, where_clause):
-        data = self.sanatize(data)
         if self.getOne(table_name, where_clause).toJSON() is None:
             return self.insert(table_name, data, where_clause=where_clause)
-        return self.update(table_name, where_clause, updatedData)
+        return self.update(table_name, where_clause, updatedData, read_back=True)
 
-    def toJSON(self):
-        if (
-            self._results is None
-            or len(self._results) == 0
-            or self._results is False
-            or self._results == "null"
-        ):
-            return None
-        return json.dumps(self._results, default=str)
+    def upsert_many(self, table_name, rows, key, update_columns=None, chunk_size=500):
+        """Insert or update rows with one INSERT ... ON DUPLICATE KEY UPDATE per chunk.
 
-    def fetch(self):
-        json_data = self.toJSON()
-        if json_data is None:
-            return None
-        try:
-            return json.loads(json_data)
-        except (json.JSONDecodeError, TypeError) as e:
-            print(f"❌ JSON decode error: {str(e)}")
-            return None
+        `key` has to carry a unique index. New rows get every column, existing ones only
+        `update_columns` (all but the key by default). Results are the {"id", key} pairs of the
+        written rows in input order, read back by key in the same transaction.
+        """
+        if not rows:
+            return SQLResult([])
+        columns = tuple(rows[0].keys())
+        if key not in columns:
+            raise ValueError("upsert_many rows need the key column %s" % key)
+        if update_columns is None:
+            update_columns = [column for column in columns if column != key]
+        update_columns = tuple(update_columns)
 
-    def toHTML(self):
-        return print_html(self.toJSON())
+        written = {}
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    for i in range(0, len(rows), chunk_size):
+                        chunk = rows[i:i + chunk_size]
+                        params = []
+                        for row in chunk:
+                            if row.keys() != set(columns):
+                                raise ValueError("upsert_many rows must all have the same columns")
+                            params.extend(row[column] for column in columns)
+                        cursor.execute(compile_upsert(table_name, columns, update_columns, len(chunk)), params)
+
+                        shape, key_params = parse_where([(key, "in", [row[key] for row in chunk])])
+                        cursor.execute(compile_select(table_name, ("id", key), shape), key_params)
+                        for record in cursor.fetchall():
+                            written[str(record[key])] = record
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        self.onDebug("[sql.upsert_many] %s rows into %s" % (len(rows), table_name))
+        return SQLResult([written[str(row[key])] for row in rows if str(row[key]) in written])
+
+
+def write_key(where_clause):
+    if isinstance(where_clause, dict):
+        return repr(sorted(where_clause.items()))
+    return repr(where_clause)
+
+
+class WriteBuffer:
+    """Unit of work that queues SQLConnector writes and commits them together.
+
+    Flushes in one transaction once `max_rows` writes are queued or the oldest one has waited
+    `max_age` seconds (checked as writes come in), and on flush() or leaving the `with` block.
+    Writes run in the order they were queued; after a write fails, later writes with the same key
+    (table and where clause unless given) are skipped so an older value never lands on top of a
+    newer one. Failed writes are returned by flush() and collected in `failures`.
+    """
+
+    def __init__(self, sql: SQLConnector, max_rows=500, max_age=5.0, on_failure=None):
+        self.sql = sql
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.on_failure = on_failure
+        self.pending = []
+        self.first_queued_at = None
+        self.failures = []
+        self.written = 0
+        self.flushes = 0
+        self.sequence = 0
+        self.lock = threading.Lock()
+        # held for the whole flush so two flushes can never commit out of order
+        self.flush_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+    def update(self, table_name, where_clause, data, fields=None, key=None):
+        sql, params = self.sql.update_sql(table_name, where_clause, data, fields)
+        return self.queue("update", table_name, write_key(where_clause) if key is None else key, sql, params)
+
+    def insert(self, table_name, data, key=None):
+        sql, params = self.sql.insert_sql(table_name, data)
+        return self.queue("insert", table_name, key, sql, params)
+
+    def delete(self, table_name, where_clause, fields=None, key=None):
+        sql, params = self.sql.delete_sql(table_name, where_clause, fields)
+        return self.queue("delete", table_name, write_key(where_clause) if key is None else key, sql, params)
+
+    def queue(self, kind, table_name, key, sql, params):
+        with self.lock:
+            self.sequence += 1
+            if not self.pending:
+                self.first_queued_at = time.monotonic()
+            self.pending.append({
+                "kind": kind,
+                "table": table_name,
+                # inserts without a key never block each other
+                "key": (table_name, key if key is not None else ("#", self.sequence)),
+                "sql": sql,
+                "params": params,
+            })
+            due = len(self.pending) >= self.max_rows or time.monotonic() - self.first_queued_at >= self.max_age
+        if due:
+            self.flush()
+        return self
+
+    def flush(self):
+        """Commit everything queued so far; returns {"written": n, "failed": [write + error]}"""
+        with self.flush_lock:
+            with self.lock:
+                writes, self.pending = self.pending, []
+                self.first_queued_at = None
+            if not writes:
+                return {"written": 0, "failed": []}
+
+            written = 0
+            failed = []
+            failed_keys = set()
+            try:
+                with self.sql.get_connection() as conn:
+                    with conn.cursor() as cursor:
+                        for write in writes:
+                            if write["key"] in failed_keys:
+                                failed.append(dict(write, error="skipped, an earlier write for the same key failed"))
+                                continue
+                            try:
+                                cursor.execute(write["sql"], write["params"])
+                                written += 1
+                            except pymysql.err.OperationalError:
+                                raise
+                            except pymysql.err.MySQLError as e:
+                                # InnoDB undid only this statement, the rest of the transaction stands
+                                failed_keys.add(write["key"])
+                                failed.append(dict(write, error=str(e)))
+                        conn.commit()
+            except pymysql.err.OperationalError as e:
+                # deadlock or lost connection: the whole transaction is gone
+                written = 0
+                failed = [dict(write, error=str(e)) for write in writes]
+
+            self.written += written
+            self.flushes += 1
+            self.failures.extend(failed)
+            print(f"[db.buffer] committed {written} writes in one transaction" + (f", {len(failed)} failed" if failed else ""))
+            if self.on_failure:
+                for failure in failed:
+                    self.on_failure(failure)
+            return {"written": written, "failed": failed}
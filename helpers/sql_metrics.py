@@ -0,0 +1,193 @@
+import functools
+import json
+import os
+import re
+import threading
+
+from dotenv import load_dotenv
+
+from helpers.odoo_metrics import Histogram
+
+load_dotenv()
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBER = re.compile(r"(?<![\w`.])-?\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_SEPARATOR = re.compile(r"\s*,\s*")
+_CASES = re.compile(r"(WHEN \? THEN \?)(?: \1)+")
+_SPACE = re.compile(r"\s+")
+
+
+def closing_paren(text, start):
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == "(":
+            depth += 1
+        elif text[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def collapse_groups(text):
+    """Fold runs of identical parenthesised groups, such as VALUES rows holding NOW(), into one"""
+    out = []
+    i = 0
+    while i < len(text):
+        end = closing_paren(text, i) if text[i] == "(" else -1
+        if end < 0:
+            out.append(text[i])
+            i += 1
+            continue
+        group = "(" + collapse_groups(text[i + 1:end]) + ")"
+        out.append(group)
+        i = end + 1
+        repeated = False
+        while True:
+            separator = _SEPARATOR.match(text, i)
+            if separator is None or not text.startswith("(", separator.end()):
+                break
+            next_end = closing_paren(text, separator.end())
+            if next_end < 0 or "(" + collapse_groups(text[separator.end() + 1:next_end]) + ")" != group:
+                break
+            repeated = True
+            i = next_end + 1
+        if repeated:
+            out.append(", ...")
+    return "".join(out)
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_shape(sql):
+    """SQL text with literals and placeholders replaced by ?, so one query reports as one line
+    whatever its values or IN-list length"""
+    shape = _SPACE.sub(" ", sql).strip()
+    shape = _STRING.sub("?", shape)
+    shape = shape.replace("%s", "?")
+    shape = _NUMBER.sub("?", shape)
+    shape = _LIST.sub("?, ...", shape)
+    shape = collapse_groups(shape)
+    shape = _CASES.sub(r"\1 ...", shape)
+    return shape
+
+
+class StatementStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.wait_seconds = 0.0
+        self.latency = Histogram()
+
+
+class CycleStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.wait_seconds = 0.0
+
+
+class SqlMetrics:
+    """In-process timings of every MySQL statement, keyed by statement shape"""
+
+    def __init__(self, slow_threshold=None):
+        self.slow_threshold = slow_threshold
+        self.stats = {}
+        # the same numbers since the last cycle_summary()
+        self.cycle = {}
+        self.lock = threading.Lock()
+
+    def record(self, sql, seconds, rows=0, wait_seconds=0.0, error=None):
+        shape = statement_shape(sql)
+        with self.lock:
+            stats = self.stats.get(shape)
+            if stats is None:
+                stats = self.stats[shape] = StatementStats()
+            stats.calls += 1
+            stats.rows += rows
+            stats.wait_seconds += wait_seconds
+            stats.latency.observe(seconds)
+
+            cycle = self.cycle.get(shape)
+            if cycle is None:
+                cycle = self.cycle[shape] = CycleStats()
+            cycle.calls += 1
+            cycle.rows += rows
+            cycle.seconds += seconds
+            cycle.wait_seconds += wait_seconds
+            if error is not None:
+                stats.errors += 1
+                cycle.errors += 1
+
+        if self.slow_threshold and seconds >= self.slow_threshold:
+            print(
+                f"[db.slow] {seconds:.2f}s rows={rows} wait={wait_seconds:.3f}s: {shape[:300]}"
+                f"{' error=' + str(error) if error is not None else ''}"
+            )
+
+    def add_rows(self, sql, rows):
+        """Rows read later off a streaming cursor, after its statement was recorded"""
+        shape = statement_shape(sql)
+        with self.lock:
+            if shape in self.stats:
+                self.stats[shape].rows += rows
+            if shape in self.cycle:
+                self.cycle[shape].rows += rows
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                shape: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "rows": stats.rows,
+                    "pool_wait_seconds": round(stats.wait_seconds, 6),
+                    "latency": stats.latency.to_dict(),
+                }
+                for shape, stats in sorted(self.stats.items(), key=lambda item: -item[1].latency.sum)
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def cycle_summary(self, label="cycle", top=5):
+        """Print and return the totals since the previous call, heaviest statements first"""
+        with self.lock:
+            cycle, self.cycle = self.cycle, {}
+        ranked = sorted(cycle.items(), key=lambda item: -item[1].seconds)
+        summary = {
+            "statements": sum(stats.calls for stats in cycle.values()),
+            "errors": sum(stats.errors for stats in cycle.values()),
+            "rows": sum(stats.rows for stats in cycle.values()),
+            "seconds": round(sum(stats.seconds for stats in cycle.values()), 6),
+            "pool_wait_seconds": round(sum(stats.wait_seconds for stats in cycle.values()), 6),
+            "top": [
+                {"shape": shape, "calls": stats.calls, "rows": stats.rows, "seconds": round(stats.seconds, 6)}
+                for shape, stats in ranked[:top]
+            ],
+        }
+        print(
+            f"[db.{label}] {summary['statements']} statements in {summary['seconds']:.2f}s, "
+            f"{summary['rows']} rows, pool wait {summary['pool_wait_seconds']:.2f}s"
+            + (f", {summary['errors']} errors" if summary["errors"] else "")
+        )
+        for item in summary["top"]:
+            print(f"   {item['seconds']:7.3f}s x{item['calls']:<5d} {item['rows']:>7d} rows  {item['shape'][:160]}")
+        return summary
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.cycle.clear()
+
+
+def _slow_threshold():
+    value = os.getenv("DB_SLOW_QUERY_SECONDS")
+    return float(value) if value else None
+
+
+# shared by every SQLConnector in the process, next to the pool they all check out from
+sql_metrics = SqlMetrics(slow_threshold=_slow_threshold())
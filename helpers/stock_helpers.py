@@ -1,8 +1,10 @@
 import datetime
 import json
+import os
 
 from numpy import number
 from helpers.helpers import slugify
+from helpers.odoo_batching import get_batcher
 from helpers.odoo_connector import OdooConnector
 from helpers.sql_connector import SQLConnector
 from helpers.user_helpers import UsersHelper
@@ -39,4 +41,95 @@ class StockPickingOrder:
         picking = picking[0]
         return picking
 
-   
\ No newline at end of file
+   
+
+
+def parse_ids(value):
+    return [int(i) for i in (value or "").split(",") if i.strip()]
+
+
+class StockQuantReader:
+    """On-hand quantities summed from stock.quant with one read_group per chunk of ids.
+
+    `qty_available` on product.template/product.product is computed record by record inside Odoo,
+    grouping the quants lets the database sum thousands of products in a single call.
+    Quantities count internal locations unless `location_ids` or `warehouse_ids` narrow it down,
+    ids without any quant come back as 0. Template totals are folded from their variants' quants,
+    stock.quant only stores product_id.
+    Chunks are sized by two adaptive batchers per `name`, one for the product.product reads and one
+    for the read_groups, and never exceed `chunk_size`.
+    """
+
+    def __init__(self, connector: OdooConnector, location_ids=None, warehouse_ids=None, chunk_size=5000, name="stock_quant"):
+        self.connector = connector
+        self.location_ids = location_ids if location_ids is not None else parse_ids(os.getenv("ODOO_STOCK_LOCATION_IDS"))
+        self.warehouse_ids = warehouse_ids if warehouse_ids is not None else parse_ids(os.getenv("ODOO_STOCK_WAREHOUSE_IDS"))
+        self.chunk_size = chunk_size
+        self.template_batcher = get_batcher(name + ".templates", initial=chunk_size, max_size=chunk_size)
+        self.quant_batcher = get_batcher(name + ".quants", initial=chunk_size, max_size=chunk_size)
+
+    def domain(self, extra=()):
+        domain = list(extra)
+        if self.location_ids:
+            domain.append(("location_id", "child_of", self.location_ids))
+        else:
+            domain.append(("location_id.usage", "=", "internal"))
+        if self.warehouse_ids:
+            domain.append(("warehouse_id", "in", self.warehouse_ids))
+        return domain
+
+    def chunks(self, ids, batcher):
+        return batcher.chunks(list(dict.fromkeys(ids)))
+
+    def sum_by(self, group_field, filter_field=None, ids=None):
+        """{group id: quantity} for the quants whose `filter_field` is in ids, or for all quants.
+
+        Both fields have to be stored on stock.quant (product_id, location_id, ...); related fields
+        such as product_tmpl_id cannot be grouped by.
+        """
+        quantities = {}
+        for chunk in ([None] if ids is None else self.chunks(ids, self.quant_batcher)):
+            extra = [(filter_field, "in", chunk)] if chunk is not None else []
+            with self.quant_batcher.measure(len(chunk or ())):
+                groups = self.connector.execute_kw(
+                    "stock.quant",
+                    "read_group",
+                    [self.domain(extra), [group_field, "quantity:sum"], [group_field]],
+                    {"lazy": False},
+                )
+            for group in groups:
+                if group.get(group_field):
+                    key = group[group_field][0]
+                    quantities[key] = quantities.get(key, 0.0) + (group.get("quantity") or 0.0)
+        for record_id in ids or []:
+            quantities.setdefault(record_id, 0.0)
+        return quantities
+
+    def by_product(self, product_ids=None):
+        return self.sum_by("product_id", "product_id", product_ids)
+
+    def by_template(self, template_ids=None):
+        return self.template_totals(self.variants(template_ids))
+
+    @staticmethod
+    def template_totals(variants):
+        """{template id: quantity} folded from the result of variants()"""
+        return {template_id: sum(record["qty_available"] for record in records) for template_id, records in variants.items()}
+
+    def variants(self, template_ids=None):
+        """{template id: [{id, default_code, product_tmpl_id, qty_available}]}, one product.product
+        search_read and one stock.quant read_group per chunk of templates"""
+        variants = {template_id: [] for template_id in template_ids or []}
+        for chunk in ([None] if template_ids is None else self.chunks(template_ids, self.template_batcher)):
+            with self.template_batcher.measure(len(chunk or ())):
+                records = list(self.connector.iter_search_read(
+                    "product.product",
+                    [("product_tmpl_id", "in", chunk)] if chunk is not None else [],
+                    ["id", "default_code", "product_tmpl_id"],
+                    page_size=self.chunk_size,
+                ))
+            quantities = self.by_product([record["id"] for record in records])
+            for record in records:
+                record["qty_available"] = quantities.get(record["id"], 0.0)
+                variants.setdefault(record["product_tmpl_id"][0], []).append(record)
+        return variants
@@ -6,10 +6,13 @@ from time import sleep
 sys.path.insert(0, 'helpers/')
 
 from helpers.file_helper import read_time_stamp, write_time_stamp
-from helpers.helpers import flatten, odooReadSearch
-from helpers.odoo_connector import OdooConnector
+from helpers.helpers import flatten
+from helpers.odoo_batching import get_batcher
+from helpers.odoo_connector import shared_connector
 from helpers.product_helpers import ProductHelper
-from helpers.sql_connector import SQLConnector
+from helpers.sql_connector import MigrationError, SQLConnector
+from helpers.sql_metrics import sql_metrics
+from helpers.stock_helpers import StockQuantReader
 
 def quick_quantity_sync(connector, sql_connector, limit=50):
     """Quick sync for quantity changes only - FIXED VERSION"""
@@ -19,8 +22,8 @@ def quick_quantity_sync(connector, sql_connector, limit=50):
         # Get recently synced products with potential quantity changes
         synced_products = sql_connector.getAll(
             "products", 
-            "`remote_key_id` IS NOT NULL AND `remote_key_id` != ''", 
-            select="id, remote_key_id, name, qty"
+            [("remote_key_id", "!=", None), ("remote_key_id", "!=", "")], 
+            select=["id", "remote_key_id", "name", "qty"]
         ).fetch()
         
         if not synced_products:
@@ -29,71 +32,52 @@ def quick_quantity_sync(connector, sql_connector, limit=50):
         
         print(f"📊 Found {len(synced_products)} synced products")
         
-        # Process in batches to avoid overwhelming the system
-        batch_size = 20
         total_updated = 0
         total_checked = 0
         
-        for i in range(0, len(synced_products), batch_size):
-            batch = synced_products[i:i + batch_size]
-            odoo_ids = [int(p['remote_key_id']) for p in batch]
-            
-            print(f"🔍 Checking batch {i//batch_size + 1}: {len(odoo_ids)} products")
+        # On-hand quantities of every synced template and its variants, summed by Odoo from stock.quant
+        # with one search_read and one read_group per chunk, chunks sized from recent Odoo latency
+        stock_reader = StockQuantReader(connector, name="quick_quantity_sync")
+        variants = stock_reader.variants([int(p['remote_key_id']) for p in synced_products])
+        odoo_quantities = stock_reader.template_totals(variants)
+        
+        changed_products = []
+        for laravel_product in synced_products:
+            odoo_qty = int(odoo_quantities.get(int(laravel_product['remote_key_id']), 0))
+            laravel_qty = int(laravel_product.get('qty', 0))
+            total_checked += 1
             
+            if odoo_qty != laravel_qty:
+                print(f"  🔄 {laravel_product['name']}: Laravel={laravel_qty}, Odoo={odoo_qty}")
+                changed_products.append((laravel_product, laravel_qty, odoo_qty))
+            else:
+                print(f"  ✅ {laravel_product['name']}: No change (qty={laravel_qty})")
+        
+        if changed_products:
+            # Write every product quantity with a few set-based statements
             try:
-                # Get current Odoo quantities
-                odoo_products = connector.read('product.template', odoo_ids, ['id', 'qty_available', 'name'])
+                result = sql_connector.apply_quantities(
+                    "products",
+                    "qty",
+                    {laravel_product['id']: odoo_qty for laravel_product, _, odoo_qty in changed_products}
+                ).fetch()
                 
-                if not odoo_products:
-                    continue
+                for change in result['changed']:
+                    print(f"    ✅ UPDATED product {change['id']}: {change['old']} → {change['new']}")
+                for product_id in result['missing']:
+                    print(f"    ❌ Update failed for product ID {product_id}")
+                total_updated = len(result['changed'])
+                
+                # Also update the variants of every product that is still there
+                missing = set(result['missing'])
+                apply_variant_quantities(sql_connector, {
+                    laravel_product['id']: variants.get(int(laravel_product['remote_key_id']), [])
+                    for laravel_product, _, _ in changed_products
+                    if laravel_product['id'] not in missing
+                })
                 
-                for odoo_product in odoo_products:
-                    # Find corresponding Laravel product
-                    laravel_product = next(
-                        (p for p in batch if int(p['remote_key_id']) == odoo_product['id']), 
-                        None
-                    )
-                    
-                    if laravel_product:
-                        odoo_qty = int(odoo_product.get('qty_available', 0))
-                        laravel_qty = int(laravel_product.get('qty', 0))
-                        total_checked += 1
-                        
-                        if odoo_qty != laravel_qty:
-                            print(f"  🔄 {laravel_product['name']}: Laravel={laravel_qty}, Odoo={odoo_qty}")
-                            
-                            # Update product quantity
-                            try:
-                                update_result = sql_connector.update(
-                                    "products", 
-                                    f"`id` = '{laravel_product['id']}'", 
-                                    {"qty": odoo_qty}
-                                )
-                                
-                                # Verify update was successful
-                                if update_result and update_result._results:
-                                    print(f"    ✅ UPDATED: {laravel_qty} → {odoo_qty}")
-                                    
-                                    # Also update variants for this product
-                                    update_variant_quantities(
-                                        connector, 
-                                        sql_connector, 
-                                        odoo_product['id'], 
-                                        laravel_product['id']
-                                    )
-                                    
-                                    total_updated += 1
-                                else:
-                                    print(f"    ❌ Update failed for product ID {laravel_product['id']}")
-                                    
-                            except Exception as e:
-                                print(f"    ❌ Error updating product {laravel_product['id']}: {str(e)}")
-                        else:
-                            print(f"  ✅ {laravel_product['name']}: No change (qty={laravel_qty})")
-                            
             except Exception as e:
-                print(f"  ❌ Error processing batch: {str(e)}")
-                continue
+                print(f"    ❌ Error updating product quantities: {str(e)}")
         
         print(f"\n✅ Quantity sync completed: Checked {total_checked}, Updated {total_updated}")
         return total_updated
@@ -104,50 +88,55 @@ def quick_quantity_sync(connector, sql_connector, limit=50):
         traceback.print_exc()
         return 0
 
-def update_variant_quantities(connector, sql_connector, template_id, laravel_product_id):
-    """Update variant quantities for a specific product"""
+def update_variant_quantities(connector, sql_connector, template_id, laravel_product_id, variants=None):
+    """Update variant quantities for a specific product, `variants` as prefetched by StockQuantReader.variants"""
     try:
-        # Get all variants for this template
-        variant_ids = connector.search('product.product', [('product_tmpl_id', '=', template_id)])
-        
-        if not variant_ids:
-            return
-        
-        # Get variant details
-        variants = connector.read('product.product', variant_ids, ['id', 'default_code', 'qty_available'])
-        
-        updated_variants = 0
-        
-        for variant in variants:
-            if variant.get('default_code'):  # Only update variants with SKU
-                try:
-                    # Update Laravel variant stock
-                    update_data = {"stock": int(variant.get('qty_available', 0))}
-                    
-                    # Update by remote_key_id if available
-                    where_clause = f"`product_id` = '{laravel_product_id}' AND `remote_key_id` = '{variant['id']}'"
-                    
-                    # First try to update by remote_key_id
-                    result = sql_connector.update("product_variants", where_clause, update_data)
-                    
-                    # If no rows affected, try by SKU
-                    if not result or not result._results:
-                        where_clause = f"`product_id` = '{laravel_product_id}' AND `sku` = '{variant['default_code']}'"
-                        result = sql_connector.update("product_variants", where_clause, update_data)
-                    
-                    if result and result._results:
-                        updated_variants += 1
-                        print(f"      ✅ Updated variant {variant['default_code']}: stock={variant['qty_available']}")
-                        
-                except Exception as e:
-                    print(f"      ⚠️ Failed to update variant {variant.get('default_code', 'unknown')}: {str(e)}")
+        # Get all variants for this template with their on-hand quantity
+        if variants is None:
+            variants = StockQuantReader(connector).variants([template_id]).get(template_id, [])
         
-        if updated_variants > 0:
-            print(f"    📦 Updated {updated_variants} variants")
+        apply_variant_quantities(sql_connector, {laravel_product_id: variants})
             
     except Exception as e:
         print(f"    ⚠️ Variant quantity update failed for template {template_id}: {str(e)}")
 
+def apply_variant_quantities(sql_connector, variants_by_product):
+    """Write variant stock for {laravel product id: Odoo variants} in bulk, matching by remote_key_id first and SKU second"""
+    # Only update variants with SKU
+    by_remote_key = {}
+    for laravel_product_id, variants in variants_by_product.items():
+        for variant in variants:
+            if variant.get('default_code'):
+                by_remote_key[(laravel_product_id, str(variant['id']))] = (variant['default_code'], int(variant.get('qty_available', 0)))
+    
+    if not by_remote_key:
+        return 0
+    
+    # First try to update by remote_key_id
+    result = sql_connector.apply_quantities(
+        "product_variants",
+        "stock",
+        {key: qty for key, (_, qty) in by_remote_key.items()},
+        key=("product_id", "remote_key_id")
+    ).fetch()
+    changed = result['changed']
+    
+    # Variants never linked to Odoo are matched by SKU
+    if result['missing']:
+        by_sku = {
+            (laravel_product_id, by_remote_key[(laravel_product_id, remote_key)][0]): by_remote_key[(laravel_product_id, remote_key)][1]
+            for laravel_product_id, remote_key in result['missing']
+        }
+        changed = changed + sql_connector.apply_quantities(
+            "product_variants", "stock", by_sku, key=("product_id", "sku")
+        ).fetch()['changed']
+    
+    for change in changed:
+        print(f"      ✅ Updated variant {change['id']} ({change['key'][1]}): stock {change['old']} → {change['new']}")
+    if changed:
+        print(f"    📦 Updated {len(changed)} variants")
+    return len(changed)
+
 def detect_quantity_changes_enhanced(connector, sql_connector, limit=100):
     """Enhanced quantity change detection with better error handling"""
     print("\n🔢 Enhanced quantity change detection...")
@@ -157,8 +146,8 @@ def detect_quantity_changes_enhanced(connector, sql_connector, limit=100):
         # Focus on products with non-zero quantities first (more likely to change)
         synced_products = sql_connector.getAll(
             "products", 
-            "`remote_key_id` IS NOT NULL AND `remote_key_id` != '' AND `qty` > 0",
-            select="id, remote_key_id, name, qty, updated_at"
+            [("remote_key_id", "!=", None), ("remote_key_id", "!=", ""), ("qty", ">", 0)],
+            select=["id", "remote_key_id", "name", "qty", "updated_at"]
         ).fetch()
         
         if not synced_products:
@@ -166,7 +155,7 @@ def detect_quantity_changes_enhanced(connector, sql_connector, limit=100):
             return 0
         
         # Sort by last update to prioritize recently changed products
-        synced_products.sort(key=lambda x: x.get('updated_at', ''), reverse=True)
+        synced_products.sort(key=lambda x: x.get('updated_at') or datetime.min, reverse=True)
         
         # Limit to most recent products
         synced_products = synced_products[:limit]
@@ -176,23 +165,21 @@ def detect_quantity_changes_enhanced(connector, sql_connector, limit=100):
         updated_count = 0
         errors_count = 0
         
-        # Process in smaller batches for better reliability
-        batch_size = 10
+        # Process in batches sized from recent Odoo latency for better reliability
+        batcher = get_batcher("detect_quantity_changes_enhanced", initial=10)
+        stock_reader = StockQuantReader(connector, name="detect_quantity_changes_enhanced")
         
-        for i in range(0, len(synced_products), batch_size):
-            batch = synced_products[i:i + batch_size]
+        for batch in batcher.chunks(synced_products):
             batch_ids = [int(p['remote_key_id']) for p in batch]
             
             try:
-                # Get Odoo data with retry logic
-                odoo_data = None
+                # Get on-hand quantities from stock.quant with retry logic
+                odoo_quantities = None
                 for attempt in range(3):
                     try:
-                        odoo_data = connector.read(
-                            'product.template',
-                            batch_ids,
-                            ['id', 'qty_available', 'name', 'write_date']
-                        )
+                        with batcher.measure(len(batch_ids)):
+                            variants = stock_reader.variants(batch_ids)
+                        odoo_quantities = stock_reader.template_totals(variants)
                         break
                     except Exception as e:
                         if attempt < 2:
@@ -201,64 +188,50 @@ def detect_quantity_changes_enhanced(connector, sql_connector, limit=100):
                         else:
                             raise
                 
-                if not odoo_data:
+                if not odoo_quantities:
+                    continue
+                
+                changed_products = []
+                for laravel_product in batch:
+                    odoo_qty = int(odoo_quantities.get(int(laravel_product['remote_key_id']), 0))
+                    if odoo_qty != int(laravel_product.get('qty', 0)):
+                        changed_products.append((laravel_product, odoo_qty))
+                
+                if not changed_products:
                     continue
                 
-                for odoo_product in odoo_data:
-                    laravel_product = next(
-                        (p for p in batch if int(p['remote_key_id']) == odoo_product['id']),
-                        None
-                    )
+                for laravel_product, odoo_qty in changed_products:
+                    print(f"\n🔄 Quantity change detected:")
+                    print(f"   Product: {laravel_product['name']}")
+                    print(f"   Laravel: {int(laravel_product.get('qty', 0))} → Odoo: {odoo_qty}")
+                
+                # Apply the whole batch with set-based updates, the result says exactly which rows changed
+                try:
+                    result = sql_connector.apply_quantities(
+                        "products",
+                        "qty",
+                        {laravel_product['id']: odoo_qty for laravel_product, odoo_qty in changed_products}
+                    ).fetch()
                     
-                    if laravel_product:
-                        odoo_qty = int(odoo_product.get('qty_available', 0))
-                        laravel_qty = int(laravel_product.get('qty', 0))
-                        
-                        if odoo_qty != laravel_qty:
-                            print(f"\n🔄 Quantity change detected:")
-                            print(f"   Product: {laravel_product['name']}")
-                            print(f"   Laravel: {laravel_qty} → Odoo: {odoo_qty}")
-                            print(f"   Last Odoo update: {odoo_product.get('write_date', 'Unknown')}")
-                            
-                            # Perform the update with verification
-                            try:
-                                # Update with explicit commit
-                                with sql_connector.get_connection() as conn:
-                                    with conn.cursor() as cursor:
-                                        update_sql = f"""
-                                        UPDATE products 
-                                        SET qty = {odoo_qty}, 
-                                            updated_at = NOW() 
-                                        WHERE id = {laravel_product['id']}
-                                        """
-                                        cursor.execute(update_sql)
-                                        conn.commit()
-                                        
-                                        # Verify the update
-                                        cursor.execute(
-                                            f"SELECT qty FROM products WHERE id = {laravel_product['id']}"
-                                        )
-                                        result = cursor.fetchone()
-                                        
-                                        if result and result['qty'] == odoo_qty:
-                                            print(f"   ✅ Successfully updated to {odoo_qty}")
-                                            updated_count += 1
-                                            
-                                            # Update variants too
-                                            update_variant_quantities(
-                                                connector,
-                                                sql_connector,
-                                                odoo_product['id'],
-                                                laravel_product['id']
-                                            )
-                                        else:
-                                            print(f"   ❌ Update verification failed")
-                                            errors_count += 1
-                                            
-                            except Exception as e:
-                                print(f"   ❌ Update failed: {str(e)}")
-                                errors_count += 1
-                                
+                    for change in result['changed']:
+                        print(f"   ✅ Product {change['id']} updated to {change['new']}")
+                    for product_id in result['missing']:
+                        print(f"   ❌ Update verification failed for product {product_id}")
+                    updated_count += len(result['changed'])
+                    errors_count += len(result['missing'])
+                    
+                    # Update variants too
+                    missing = set(result['missing'])
+                    apply_variant_quantities(sql_connector, {
+                        laravel_product['id']: variants.get(int(laravel_product['remote_key_id']), [])
+                        for laravel_product, _ in changed_products
+                        if laravel_product['id'] not in missing
+                    })
+                    
+                except Exception as e:
+                    print(f"   ❌ Update failed: {str(e)}")
+                    errors_count += len(changed_products)
+                
             except Exception as e:
                 print(f"  ❌ Batch processing error: {str(e)}")
                 errors_count += len(batch)
@@ -296,7 +269,7 @@ def enhanced_product_sync_runner():
     print("🚀 Starting enhanced product sync with improved quantity updates...")
     
     try:
-        connector = OdooConnector()
+        connector = shared_connector()
         sql_connector = SQLConnector()
         helper = ProductHelper(connector, sql_connector)
         
@@ -308,7 +281,11 @@ def enhanced_product_sync_runner():
         
         # Run migrations
         print("🔧 Running database migrations...")
-        sql_connector.migrate()
+        try:
+            sql_connector.migrate()
+        except MigrationError as e:
+            # failed versions back off instead of rebuilding a table on every cycle
+            print(f"⚠️ {e}")
         
         # 1. Regular product sync (for new products and major changes)
         print("\n" + "="*60)
@@ -352,6 +329,7 @@ def enhanced_product_sync_runner():
         print(f"   - Image updates: {img_updates}")
         print(f"   - Total quantity updates: {qty_updates + quick_updates}")
         print(f"   - Next sync in 30 seconds...")
+        sql_metrics.cycle_summary("cycle")
         
     except Exception as e:
         print(f"❌ Enhanced sync failed: {str(e)}")
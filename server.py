@@ -7,13 +7,15 @@ Very simple HTTP server in python for logging requests
 Usage::
     ./server.py [<port>]
 """
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import logging
 import os
 
 from dotenv import load_dotenv
 
 from helpers.http_helper import HttpHelper
+from helpers.odoo_governor import INTERACTIVE, odoo_governor
+from helpers.sql_connector import SQLConnector
 
 load_dotenv()
 
@@ -42,8 +44,14 @@ class S(BaseHTTPRequestHandler):
         return HttpHelper(self).onPut(put_data)
     
 
-def run(server_class=HTTPServer, handler_class=S, port=8080):
+def run(server_class=ThreadingHTTPServer, handler_class=S, port=8080):
     logging.basicConfig(level=logging.INFO)
+    # order API calls share Odoo with the sync worker, give them priority over background sync
+    odoo_governor.default_lane = INTERACTIVE
+    try:
+        SQLConnector().prewarm()
+    except Exception as e:
+        logging.warning('Database pool prewarm failed: %s', e)
     server_address = ('0.0.0.0', port)
     httpd = server_class(server_address, handler_class)
     logging.info('Starting httpd...\n on port %s', port)
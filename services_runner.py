@@ -8,7 +8,7 @@ def main():
     for attempt in range(max_retries):
         try:
             print(f"[Migration] Attempting migration (attempt {attempt + 1}/{max_retries})")
-            SQLConnector().migrate()
+            SQLConnector().migrate(retry_failed=True)
             print("[Migration] Migration completed successfully")
             break
         except Exception as e:
@@ -18,8 +18,13 @@ def main():
                 print(f"[Migration] Retrying in {wait_time} seconds...")
                 sleep(wait_time)
             else:
-                print("[Migration] All migration attempts failed, exiting")
-                sys.exit(1)
+                # the product runner migrates again every cycle, pending migrations are retried there after their backoff
+                print("[Migration] All migration attempts failed, starting the service anyway")
+    
+    try:
+        SQLConnector().prewarm()
+    except Exception as e:
+        print(f"[Pool] Database pool prewarm failed: {str(e)}")
     
     sleep(5)
     
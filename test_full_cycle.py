@@ -118,8 +118,8 @@ def test_full_cycle():
         print(f"\n💾 Step 8: Testing product sync to database...")
         
         # Clear existing data for clean test
-        sql_connector.connection.execute(f"DELETE FROM products WHERE remote_key_id = '{product['id']}'")
-        sql_connector.connection.execute(f"DELETE FROM product_variants WHERE remote_key_id IN (SELECT id FROM product_variants WHERE product_id IN (SELECT id FROM products WHERE remote_key_id = '{product['id']}'))")
+        sql_connector.delete("product_variants", "product_id IN (SELECT id FROM products WHERE remote_key_id = %s)", [str(product['id'])])
+        sql_connector.delete("products", {"remote_key_id": str(product['id'])})
         print("🗑️  Cleared existing test data")
         
         # Perform the sync